@@ -0,0 +1,222 @@
+"""
+Headless benchmarks of the fitting core of curvefitgui
+
+Times the stages of a fit (model preparation, masking, solver call, complete fit and formatting
+of the values) for a range of data sizes, parameter counts and fixed/free mixes. Only the public
+entry points (Fitter and curve_fit_wrapper) are used, so every version of the package can be
+benchmarked. The covariance rebuild and the creation of the report happen inside Fitter.fit(); they
+are taken from the timings of instrumented fits (Fitter(..., instrument=True)), and are left out for
+versions without instrumented fits. No display is needed. The results are written as json and can be compared between
+versions:
+
+    python benchmarks/bench_core.py --output new.json
+    python benchmarks/bench_core.py --quick --output new.json --compare old.json
+"""
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')  # never open a window
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import argparse
+import inspect
+import json
+import platform
+import sys
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from curvefitgui import __version__  # noqa: E402
+from curvefitgui import _tools  # noqa: E402
+
+
+SIZES = [10**2, 10**3, 10**4, 10**5, 10**6, 10**7]
+QUICK_SIZES = [10**2, 10**3, 10**4, 10**5]
+NUMPARS = [2, 4, 8]
+MIN_TIME = 0.2  # seconds spent per benchmark, at least one run is made
+MAX_REPEATS = 1000
+
+
+def make_model(npars):
+    """ returns a sum of decaying exponentials with npars named parameters (and an offset if npars is odd) """
+    names = [f'p{i}' for i in range(npars)]
+    terms = [f'{names[i]} * np.exp(-{names[i + 1]} * x)' for i in range(0, npars - 1, 2)]
+    if npars % 2:
+        terms.append(names[-1])
+    source = f"def model(x, {', '.join(names)}):\n    return {' + '.join(terms)}\n"
+    namespace = {'np': np}
+    exec(source, namespace)
+    return namespace['model']
+
+
+def true_pars(npars):
+    """ well separated amplitudes and rates """
+    pars = []
+    for i in range(npars // 2):
+        pars += [1. + i, 0.5 * 3**i]
+    if npars % 2:
+        pars.append(0.3)
+    return np.array(pars)
+
+
+def make_case(npoints, npars, nfixed, seed=0):
+    rng = np.random.default_rng(seed)
+    func = make_model(npars)
+    popt = true_pars(npars)
+    x = np.linspace(0., 5., npoints)
+    ye = 0.01 * np.ones(npoints)
+    y = func(x, *popt) + ye * rng.normal(size=npoints)
+    p0 = popt * 1.05
+    pF = np.zeros(npars, dtype=bool)
+    pF[npars - nfixed:] = True
+    p0[pF] = popt[pF]  # fixed parameters at their true value
+    return func, x, y, ye, p0, pF
+
+
+def timed(stmt, setup=None):
+    """ returns the best and median time of stmt(), setup() is executed (untimed) before each run """
+    times = []
+    start = time.perf_counter()
+    while not times or (time.perf_counter() - start < MIN_TIME and len(times) < MAX_REPEATS):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        stmt()
+        times.append(time.perf_counter() - t0)
+    return min(times), float(np.median(times)), len(times)
+
+
+def bench_case(npoints, npars, nfixed):
+    func, x, y, ye, p0, pF = make_case(npoints, npars, nfixed)
+    results = {}
+
+    def prepare():
+        return _tools.Fitter(func, x, y, None, ye, list(p0), False, None)
+
+    fitter = prepare()
+    for par, fix in zip(fitter.model.fitpars, pF):
+        par.fixed = bool(fix)
+    results['prepare'] = timed(prepare)
+
+    def mask():
+        fitter.data.set_mask(0.5, 4.5)
+        fitter.data.get()
+    results['mask'] = timed(mask)
+    fitter.data.set_mask(-np.inf, np.inf)
+
+    def solve():
+        return _tools.curve_fit_wrapper(func, x, y, sigma=ye, p0=p0, pF=pF)
+    results['solve'] = timed(solve)
+
+    def fit():
+        for par, value in zip(fitter.model.fitpars, p0):
+            par.value = value
+        fitter.fit()
+    results['fit'] = timed(fit)
+
+    def format_values():
+        fitter.get_report()
+        for par in fitter.model.fitpars:
+            _tools.value_to_string(par.name, par.value, par.sigma, par.fixed)
+    results['format'] = timed(format_values)
+
+    results.update(instrumented_stages(func, x, y, ye, p0, pF, ('covariance', 'report')))
+
+    return [dict(stage=stage, npoints=npoints, npars=npars, nfixed=nfixed,
+                 best=best, median=median, repeats=repeats)
+            for stage, (best, median, repeats) in results.items()]
+
+
+def instrumented_stages(func, x, y, ye, p0, pF, stages):
+    """ 
+    returns the best and median durations of the stages, as timed(), from the timings of instrumented fits
+    returns no stages for versions of Fitter without the instrument option
+    """
+    if 'instrument' not in inspect.signature(_tools.Fitter).parameters:
+        return {}
+    fitter = _tools.Fitter(func, x, y, None, ye, list(p0), False, None, instrument=True)
+    for par, fix in zip(fitter.model.fitpars, pF):
+        par.fixed = bool(fix)
+    samples = {name: [] for name in stages}
+    start = time.perf_counter()
+    repeats = 0
+    while not repeats or (time.perf_counter() - start < MIN_TIME and repeats < MAX_REPEATS):
+        for par, value in zip(fitter.model.fitpars, p0):
+            par.value = value
+        fitter.fit()
+        repeats += 1
+        for name in stages:
+            if name in fitter.timings:
+                samples[name].append(fitter.timings[name])
+    return {name: (min(times), float(np.median(times)), len(times)) for name, times in samples.items() if times}
+
+
+def run(sizes, numpars):
+    records = []
+    for npars in numpars:
+        for nfixed in sorted({0, npars // 2}):
+            for npoints in sizes:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    case = bench_case(npoints, npars, nfixed)
+                for record in case:
+                    print(f"{record['stage']:>10}  N={npoints:<9d} pars={npars:<2d} fixed={nfixed:<2d} "
+                          f"best={record['best']:.3e} s  median={record['median']:.3e} s")
+                records += case
+    return records
+
+
+def key(record):
+    return (record['stage'], record['npoints'], record['npars'], record['nfixed'])
+
+
+def compare(records, filename, threshold):
+    """ prints the ratio new/old of the best times and returns the number of slower benchmarks """
+    with open(filename) as file:
+        old = {key(record): record for record in json.load(file)['results']}
+    slower = 0
+    print(f'\ncomparison with {filename} (ratio new/old of best times)')
+    for record in records:
+        if key(record) not in old:
+            continue
+        ratio = record['best'] / old[key(record)]['best']
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            slower += 1
+        print(f"{record['stage']:>10}  N={record['npoints']:<9d} pars={record['npars']:<2d} "
+              f"fixed={record['nfixed']:<2d} ratio={ratio:6.2f}{flag}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='limit the data sizes to 1e5 points')
+    parser.add_argument('--sizes', type=float, nargs='+', help='data sizes to benchmark')
+    parser.add_argument('--npars', type=int, nargs='+', default=NUMPARS, help='parameter counts to benchmark')
+    parser.add_argument('--output', help='json file to write the results to')
+    parser.add_argument('--compare', help='json file with results of a previous run')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='ratio new/old above which a benchmark is reported as slower')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes] if args.sizes else (QUICK_SIZES if args.quick else SIZES)
+    records = run(sizes, args.npars)
+
+    if args.output:
+        meta = dict(curvefitgui=__version__, python=platform.python_version(), numpy=np.__version__,
+                    scipy=scipy.__version__, machine=platform.machine(), processor=platform.processor(),
+                    system=platform.system(), date=datetime.now().isoformat(timespec='seconds'))
+        with open(args.output, 'w') as file:
+            json.dump(dict(meta=meta, results=records), file, indent=1)
+
+    if args.compare:
+        return 1 if compare(records, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Import-time budget of curvefitgui
+
+Measures the time of `import curvefitgui` in fresh interpreters and checks that fitting
+without the gui does not import the Qt or matplotlib packages. Exits with a non-zero
+status if the budget is exceeded or if a gui package is imported:
+
+    python benchmarks/bench_import.py --budget 0.75
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUDGET = 0.75  # seconds, the import of numpy and scipy.optimize takes most of this
+GUI_PACKAGES = ('PyQt5', 'PyQt6', 'matplotlib')
+
+PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+import curvefitgui
+t1 = time.perf_counter()
+import numpy as np
+def f(x, a, b):
+    return a * x + b
+x = np.linspace(0, 1, 20)
+curvefitgui.curve_fit_gui(f, x, 2 * x + 1 + 0.01 * np.sin(50 * x), showgui=False)
+t2 = time.perf_counter()
+modules = sorted({name.split('.')[0] for name in sys.modules})
+print(json.dumps(dict(import_time=t1 - t0, fit_time=t2 - t1, modules=modules)))
+"""
+
+
+def probe():
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    output = subprocess.run([sys.executable, '-c', PROBE], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=BUDGET, help='maximum import time in seconds')
+    parser.add_argument('--repeats', type=int, default=5, help='number of fresh interpreters')
+    parser.add_argument('--output', help='json file to write the results to')
+    args = parser.parse_args(argv)
+
+    results = [probe() for _ in range(args.repeats)]
+    best = min(result['import_time'] for result in results)
+    gui_imported = sorted(set(GUI_PACKAGES) & set(results[0]['modules']))
+
+    print(f'import curvefitgui: best {best:.3f} s of {args.repeats} (budget {args.budget:.3f} s)')
+    print(f"headless fit after import: {min(result['fit_time'] for result in results):.3f} s")
+    print(f"gui packages imported: {', '.join(gui_imported) or 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(dict(import_time=best, budget=args.budget, gui_imported=gui_imported,
+                           import_times=[result['import_time'] for result in results]), file, indent=1)
+
+    return 0 if best <= args.budget and not gui_imported else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,11 @@
 from ._settings import settings
 from ._curvefitgui import curve_fit_gui
 from ._curvefitgui import linear_fit_gui
+from ._curvefitgui import polynomial_fit_gui
+from ._curvefitgui import curve_fit_batch
+from ._curvefitgui import curve_fit_global_gui
+from ._cache import FitCache
+from ._linear import LinearModel, PolynomialModel
 
 from ._version import __version__
 CFGversion = __version__
\ No newline at end of file
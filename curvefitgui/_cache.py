@@ -0,0 +1,210 @@
+"""
+Cache of fit results keyed on the data, model, mask and start values of a fit
+"""
+import os
+import sys
+import types
+import sysconfig
+import hashlib
+import functools
+from collections import OrderedDict
+import numpy as np
+
+from ._settings import settings
+
+
+class FitCache:
+    """
+    least recently used cache of fit results (popt, pcov) with an optional on-disk backend
+    maxsize : maximum number of results kept in memory, the least recently used result is evicted first
+    path : directory in which results are also stored, so that they persist across sessions (optional)
+    """
+
+    def __init__(self, maxsize=128, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return len(self._results)
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key):
+        """ returns the cached (popt, pcov) for key or None if not available """
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+        if self.path is not None and os.path.exists(self._filename(key)):
+            with np.load(self._filename(key)) as stored:
+                result = (stored['popt'], stored['pcov'])
+            self._store(key, result)
+            self.hits += 1
+            return result
+        self.misses += 1
+        return None
+
+    def put(self, key, popt, pcov):
+        """ stores the result of a fit """
+        result = (np.array(popt), np.array(pcov))
+        self._store(key, result)
+        if self.path is not None:
+            np.savez(self._filename(key), popt=result[0], pcov=result[1])
+
+    def _store(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """ removes all results from memory, results on disk are kept """
+        self._results.clear()
+
+    def info(self):
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    size=len(self._results), maxsize=self.maxsize, path=self.path)
+
+
+_default_cache = None
+
+
+def get_cache(cache):
+    """
+    returns the FitCache to use for the option cache:
+    None or False for no cache, True for the default cache defined in the settings or a FitCache instance
+    """
+    global _default_cache
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        if _default_cache is None:
+            _default_cache = FitCache(settings['CACHE_SIZE'], settings['CACHE_PATH'])
+        return _default_cache
+    return cache
+
+
+class _Unidentified(Exception):
+    """ raised for values that can not be identified reliably by their contents """
+
+
+def _update(h, value, active):
+    """
+    updates the hash h with the contents of value: numbers, strings, numpy arrays, containers, functions
+    (code, defaults, closure cells and the globals they use) and objects (class and attributes), so that
+    equal contents give equal hashes, also across sessions. active holds the ids of the objects being hashed,
+    to handle references to themselves. Raises _Unidentified for other values.
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, np.generic)):
+        h.update(f'{type(value).__name__}:{value!r};'.encode())
+        return
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            raise _Unidentified('array of objects')
+        array = np.ascontiguousarray(value)
+        h.update(f'ndarray:{array.dtype.str}{array.shape};'.encode())
+        h.update(array.reshape(-1).data)  # without a copy of (memory-mapped) data
+        return
+    if isinstance(value, types.ModuleType):
+        h.update(f'module:{value.__name__};'.encode())
+        return
+    if isinstance(value, (types.BuiltinFunctionType, np.ufunc)) or \
+            isinstance(value, (types.FunctionType, type)) and _is_library(value.__module__):
+        # functions and classes of installed packages and the standard library are identified by their name
+        h.update(f'named:{getattr(value, "__module__", "")}.{value.__qualname__};'.encode())
+        return
+    if id(value) in active:
+        h.update(f'ref:{active.index(id(value))};'.encode())  # e.g. a recursive function
+        return
+    active.append(id(value))
+    if isinstance(value, (list, tuple)):
+        h.update(f'{type(value).__name__}:{len(value)};'.encode())
+        for item in value:
+            _update(h, item, active)
+    elif isinstance(value, dict):
+        h.update(f'dict:{len(value)};'.encode())
+        for key in sorted(value, key=repr):
+            _update(h, key, active)
+            _update(h, value[key], active)
+    elif isinstance(value, types.CodeType):
+        h.update(b'code:')
+        h.update(value.co_code)
+        _update(h, value.co_names, active)
+        _update(h, value.co_consts, active)
+    elif isinstance(value, types.FunctionType):
+        h.update(f'function:{value.__module__}.{value.__qualname__};'.encode())
+        _update(h, value.__code__, active)
+        _update(h, value.__defaults__, active)
+        _update(h, value.__kwdefaults__, active)
+        try:
+            _update(h, [cell.cell_contents for cell in value.__closure__ or []], active)
+        except ValueError:
+            raise _Unidentified('empty closure cell')
+        names = _global_names(value.__code__)
+        _update(h, {name: value.__globals__[name] for name in names if name in value.__globals__}, active)
+    elif isinstance(value, types.MethodType):
+        _update(h, value.__func__, active)
+        _update(h, value.__self__, active)
+    elif isinstance(value, functools.partial):
+        _update(h, (value.func, value.args, value.keywords), active)
+    elif isinstance(value, type):
+        h.update(f'class:{value.__module__}.{value.__qualname__};'.encode())
+        for cls in value.__mro__:
+            if cls.__module__ != 'builtins':
+                _update(h, {name: attr for name, attr in vars(cls).items() if isinstance(attr, types.FunctionType)}, 
+                        active)
+    elif hasattr(value, '__dict__'):
+        # metadata such as __doc__ and __signature__ is not part of the identity of an object
+        _update(h, type(value), active)
+        _update(h, {name: attr for name, attr in vars(value).items() if not name.startswith('__')}, active)
+    else:
+        raise _Unidentified(f'{type(value).__qualname__} object')
+    active.pop()
+
+
+_library_paths = None
+
+
+def _is_library(name):
+    """ returns True if the module name is part of the standard library or an installed package """
+    global _library_paths
+    if _library_paths is None:
+        paths = sysconfig.get_paths()
+        _library_paths = tuple({os.path.join(os.path.realpath(paths[key]), '') 
+                                for key in ('stdlib', 'platstdlib', 'purelib', 'platlib')})
+    filename = getattr(sys.modules.get(name), '__file__', None)
+    return filename is not None and os.path.realpath(filename).startswith(_library_paths)
+
+
+def _global_names(code):
+    """ returns the names used by code and the code objects it contains, such as comprehensions and lambdas """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def fit_key(func, jac, arrays, values, options):
+    """
+    returns a hash (hex string) that identifies a fit, or None if the fit function, the jacobian or an option 
+    can not be identified reliably by its contents, in which case the fit should not be cached
+    func, jac : fit function and jacobian
+    arrays : numpy arrays (or None) such as the data and the mask
+    values : other values that define the fit, such as p0, fixed flags and the weight option
+    options : dict with additional keyword arguments of the fit
+    """
+    h = hashlib.blake2b(digest_size=20)
+    try:
+        _update(h, (func, jac, list(arrays), [np.asarray(value) for value in values], options), [])
+    except _Unidentified:
+        return None
+    return h.hexdigest()
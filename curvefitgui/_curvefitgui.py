@@ -1,6 +1,23 @@
 
 import numpy as np
-from ._gui import execute_gui
+from ._tools import Fitter, batch_fit
+from ._global import GlobalFitter
+from ._linear import PolynomialModel, line_model
+
+
+def execute(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
+            absolute_sigma, jac, showgui, **kwargs):
+    """
+    performs the fit directly if showgui is False, otherwise executes the GUI
+    the Qt and matplotlib packages are only imported when the GUI is shown
+    """
+    if not showgui:
+        afitter = Fitter(f, xdata, ydata, xerr, yerr, p0, absolute_sigma, jac, **kwargs)
+        return afitter.fit()
+
+    from ._gui import execute_gui
+    return execute_gui(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
+                       absolute_sigma, jac, showgui, **kwargs)
 
 
 def linear_fit_gui(xdata, ydata, xerr=None, yerr=None, xlabel='x-axis', ylabel='y-axis', showgui=True):   
@@ -34,11 +51,6 @@ def linear_fit_gui(xdata, ydata, xerr=None, yerr=None, xlabel='x-axis', ylabel='
         the estimated covariance matrix op popt
 
 
-    Notes:
-    ------
-    Not all functionality of curve_fit() is currently implemented. The solver is limited to the
-    use of the Levenberg-Marquard algorithm. 
-
     Examples:
     ---------
         
@@ -58,23 +70,80 @@ def linear_fit_gui(xdata, ydata, xerr=None, yerr=None, xlabel='x-axis', ylabel='
     
     """  
 
-    # create fit function
-    def f(x, a, b):
-        """
-        Linear fit
-        y = ax + b
-        a: slope
-        b: intercept
-        """
-        return a * x + b
+    # create fit function, a LinearModel is fitted directly without iterations
+    f = line_model()
 
     p0=None
     absolute_sigma=False
     jac=None
     kwargs = {}
     
-    res = execute_gui(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
-                      absolute_sigma, jac, showgui, **kwargs)  
+    res = execute(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
+                  absolute_sigma, jac, showgui, **kwargs)  
+    return res
+
+
+def polynomial_fit_gui(xdata, ydata, degree=2, xerr=None, yerr=None, p0=None, xlabel='x-axis', ylabel='y-axis',
+                       absolute_sigma=False, showgui=True, **kwargs):   
+    """
+    Graphical user interface for fitting a polynomial a0 + a1 * x + ... + an * x**n
+    
+    The polynomial is linear in its parameters and is fitted directly by a (weighted) linear least 
+    squares solution, which is much faster than the iterative solver for large datasets. 
+    Parameters can be fixed as for any other model.
+
+    Arguments:
+    ----------
+    xdata : 1-D numpy array
+        x-coordinates of the data
+    ydata : 1-D numpy array
+        y-coordinates of the data
+    degree : int, optional (default:2)
+        degree n of the polynomial
+    yerr : 1-D numpy array, optional (default:None)
+        error/uncertainty in y-values used for weighted fit 
+        with a relative weight defined as 1/yerr**2  
+        (for compatibility also the use of the keyword sigma can be used for the same)               
+    xerr : 1-D numpy array, optional (default:None)
+        error in x-values. For plotting errorbars only and ignored during fitting                      
+    p0 : array-like, optional
+        values of the parameters a0...an, only used for fixed parameters and as the start of the fit 
+        if bounds are given
+    xlabel : string, optional (default:'x-values')
+        x-axis title in the plot
+    ylabel : string, optional (default:'y-values')
+        y-axis title in the plot
+    absolute_sigma : boolean, optional
+        see doc-string scipy.optimize.curve_fit() 
+    showgui : boolean, optional (default=True)
+        if True, the gui is shown, otherwise not
+    kwargs
+        keyword arguments as for curve_fit_gui(). With bounds the iterative solver is used.
+        
+    Returns:
+    --------
+    popt : numpy array
+        optimal values of a0...an
+    pcov : 2D numpy array
+        the covariance matrix of popt
+
+    Examples:
+    ---------
+        
+        # fit a parabola
+        xdata = np.linspace(-1, 1, 100)
+        ydata = 2 * xdata**2 - xdata + 0.5 + np.random.normal(scale=0.1, size=100)
+        popt, pcov = polynomial_fit_gui(xdata, ydata, degree=2)
+    
+    """  
+    if 'sigma' in kwargs:
+        yerr = kwargs.pop('sigma')
+
+    f = PolynomialModel(degree)
+    jac = None
+    
+    res = execute(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
+                  absolute_sigma, jac, showgui, **kwargs)  
     return res
 
 
@@ -88,9 +157,11 @@ def curve_fit_gui(f, xdata, ydata, xerr=None, yerr=None,
     Arguments:
     ----------
     f : callable
-        function that defines the fitfunction
+        function that defines the fitfunction. A LinearModel (a model that is linear in its 
+        parameters, defined by its basis functions) is fitted directly without iterations
     xdata : 1-D numpy array
-        x-coordinates of the data
+        x-coordinates of the data. Memory-mapped arrays, paths of .npy files and iterators
+        of 1-D chunks are accepted as well for xdata, ydata, yerr and xerr (see README)
     ydata : 1-D numpy array
         y-coordinates of the data
     yerr : 1-D numpy array, optional (default:None)
@@ -98,7 +169,7 @@ def curve_fit_gui(f, xdata, ydata, xerr=None, yerr=None,
         with a relative weight defined as 1/yerr**2  
         (for compatibility also the use of the keyword sigma can be used for the same)               
     xerr : 1-D numpy array, optional (default:None)
-        error in x-values. For plotting errorbars only and ignored during fitting                      
+        error in x-values. Used in the fit by the 'odr' solver only, otherwise for plotting errorbars only                      
     xlabel : string, optional (default:'x-values')
         x-axis title in the plot
     ylabel : string, optional (default:'y-values')
@@ -109,10 +180,28 @@ def curve_fit_gui(f, xdata, ydata, xerr=None, yerr=None,
         if True, the gui is shown, otherwise not
     absolute_sigma : boolean, optional
         see doc-string scipy.optimize.curve_fit() 
-    jac : callable, optional
-        see doc-string scipy.optimize.curve_fit() 
+    jac : callable or string, optional
+        see doc-string scipy.optimize.curve_fit(). Use 'auto', 'complex', 'forward' or 'central'
+        to derive the jacobian automatically from one stacked evaluation of the model for all
+        parameter steps (see the README for details)
+    cache : boolean or FitCache, optional (default:None)
+        if True, results of fits with identical data, model, fitrange and initial values are
+        reused from the default cache (size and on-disk location are set in config.txt). 
+        A FitCache instance can be passed to use a cache of your own.
+    bounds : 2-tuple of array-like or scipy.optimize.Bounds, optional
+        lower and upper bounds of the fit parameters, see doc-string scipy.optimize.curve_fit().
+        The bounds can be changed in the gui.
+    method : {'lm', 'trf', 'dogbox', 'odr'}, optional
+        the solver, by default 'lm' without bounds and 'trf' with bounds. 'odr' (orthogonal distance
+        regression) uses the errors in both x and y and requires xerr
+    jac_x : callable, optional
+        derivative jac_x(x, *pars) of f with respect to x, used by the 'odr' solver. If not given it is
+        computed by the complex step or by central differences
     kwargs
-        keyword arguments for compatibility (e.g. you can use sigma to specify the error in y)
+        keyword arguments passed to scipy.optimize.curve_fit(), e.g. x_scale, ftol, xtol, 
+        max_nfev or jac_sparsity (for 'trf' and 'dogbox'). Per-parameter options are given for 
+        all parameters, also the fixed ones. For compatibility you can also use sigma to specify 
+        the error in y.
         
 
     Returns:
@@ -126,11 +215,6 @@ def curve_fit_gui(f, xdata, ydata, xerr=None, yerr=None,
     ---------
     scipy.optimize.curve_fit() 
 
-    Notes:
-    ------
-    Not all functionality of curve_fit() is currently implemented. The solver is limited to the
-    use of the Levenberg-Marquard algorithm. 
-
     Examples:
     ---------
     A minimum example is shown below
@@ -163,11 +247,141 @@ def curve_fit_gui(f, xdata, ydata, xerr=None, yerr=None,
     # both keyword arguments 'sigma' and 'yerr' can be used to specify errors in the ydata
     # if 'sigma' is specified, 'yerr' is ignored.
     if 'sigma' in kwargs:
-        yerr = kwargs['sigma']
+        yerr = kwargs.pop('sigma')
 
-    res = execute_gui(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
-                      absolute_sigma, jac, showgui, **kwargs)
+    res = execute(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
+                  absolute_sigma, jac, showgui, **kwargs)
     return res
+
+
+
+def curve_fit_global_gui(f, xdata, ydata, xerr=None, yerr=None, p0=None, shared=(), labels=None,
+                         xlabel='x-axis', ylabel='y-axis', absolute_sigma=False, jac=None, showgui=True, **kwargs):
+    """
+    Graphical user interface for a global fit of a single model to several datasets at once, 
+    e.g. a temperature series, where the shared parameters have one value for all datasets and 
+    the other parameters a value per dataset.
+
+    All datasets are fitted in one least squares problem with a block-sparse jacobian, which is
+    faster and gives the correct uncertainties of the shared parameters. The gui shows one dataset
+    at a time, the dataset is selected in the toolbar.
+    
+    Arguments:
+    ----------
+    f : callable
+        function that defines the fitfunction
+    xdata : list of 1-D numpy arrays or 1-D numpy array
+        x-coordinates of each dataset, or a single array shared by all datasets
+    ydata : list of 1-D numpy arrays
+        y-coordinates of each dataset (the datasets can differ in length)
+    xerr, yerr : list of 1-D numpy arrays, optional (default:None)
+        errors in the x- and y-values of each dataset, see curve_fit_gui()
+        (for compatibility also the use of the keyword sigma can be used for yerr)
+    p0 : array-like, optional
+        initial values for fit parameters shared by all datasets, or a 2-D array with one row
+        of initial values per dataset. If not specified 1 is used for each parameter
+    shared : list of strings, optional
+        names of the shared parameters
+    labels : list of strings, optional
+        names of the datasets shown in the gui
+    xlabel, ylabel, absolute_sigma, jac, showgui
+        see curve_fit_gui()
+    kwargs
+        keyword arguments bounds, method ('trf' or 'dogbox') and the options ftol, xtol, gtol, 
+        max_nfev and x_scale of scipy.optimize.least_squares()
+    
+    Returns:
+    --------
+    popt : 2-D numpy array
+        optimal values for the fit parameters, one row per dataset
+    pcov : 3-D numpy array
+        the estimated covariance matrix of popt for each dataset. The covariance of all fitted 
+        parameters, including that between datasets, is kept in GlobalFitter.pcov
+    
+    Examples:
+    ---------
+
+        # fit exponential decays with a shared rate and an amplitude and offset per dataset
+        popt, pcov = curve_fit_global_gui(f, xdata, [y1, y2, y3], shared=['b'])
+    
+    """
+    if 'sigma' in kwargs:
+        yerr = kwargs.pop('sigma')
+
+    if not showgui:
+        return GlobalFitter(f, xdata, ydata, xerr, yerr, p0, absolute_sigma, jac, shared, labels, **kwargs).fit()
+
+    from ._gui import execute_global_gui
+    return execute_global_gui(f, xdata, ydata, xerr, yerr, p0, shared, labels, xlabel, ylabel,
+                              absolute_sigma, jac, showgui, **kwargs)
+
+
+def curve_fit_batch(f, xdata, ydata_stack, yerr_stack=None, p0=None, fixed=None,
+                    absolute_sigma=False, jac=None, n_jobs=1, chunksize=None, **kwargs):
+    """
+    Fits a single model to a stack of datasets without the GUI.
+    
+    Arguments:
+    ----------
+    f : callable
+        function that defines the fitfunction
+    xdata : 1-D or 2-D numpy array
+        x-coordinates of the data. A 1-D array is shared by all datasets, a 2-D array
+        should have the same shape as ydata_stack and holds the x-coordinates per dataset
+    ydata_stack : 2-D numpy array
+        y-coordinates of the data with one dataset per row
+    yerr_stack : 1-D or 2-D numpy array, optional (default:None)
+        error/uncertainty in y-values used for weighted fit, either shared by all
+        datasets (1-D) or per dataset (2-D). 
+        (for compatibility also the use of the keyword sigma can be used for the same)
+    p0 : array-like, optional
+        initial values for fit parameters, if not specified 1 is used for each parameter 
+    fixed : array-like of booleans, optional
+        for each fit parameter whether it is kept fixed at its value in p0 
+    absolute_sigma : boolean, optional
+        see doc-string scipy.optimize.curve_fit() 
+    jac : callable, optional
+        see doc-string scipy.optimize.curve_fit() 
+    n_jobs : int, optional (default:1)
+        number of worker processes used for the fits, -1 uses all cpu cores. Parallel
+        fitting requires f (and jac) to be defined at module level of an importable module.
+    chunksize : int, optional
+        number of datasets send to a worker process at once
+    kwargs
+        keyword arguments passed to scipy.optimize.curve_fit()
+
+    Returns:
+    --------
+    popt : 2-D numpy array
+        optimal values for the fit parameters, one row per dataset
+    pcov : 3-D numpy array
+        the estimated covariance matrix of popt for each dataset
+    status : 1-D numpy array of int
+        status code of each fit: 0 (ok), 1 (covariance could not be estimated),
+        2 (no convergence or an error in the model) or 3 (invalid data: nan or inf
+        values, errors that are not positive or too few datapoints). The popt and pcov of fits
+        that failed (status 2 or 3) are filled with nan.
+
+    Examples:
+    ---------
+
+        # fit 1000 noisy lines sharing the same x-coordinates
+        xdata = np.linspace(0, 10, 50)
+        ydata_stack = 2 * xdata + 1 + np.random.normal(size=(1000, 50))
+        popt, pcov, status = curve_fit_batch(f, xdata, ydata_stack)
+
+        # the same on all cpu cores, guard the call when processes are spawned (Windows, macOS)
+        if __name__ == '__main__':
+            popt, pcov, status = curve_fit_batch(f, xdata, ydata_stack, n_jobs=-1)
+    
+    """
+    # both keyword arguments 'sigma' and 'yerr_stack' can be used to specify errors in the ydata
+    # if 'sigma' is specified, 'yerr_stack' is ignored.
+    if 'sigma' in kwargs:
+        yerr_stack = kwargs.pop('sigma')
+
+    return batch_fit(f, xdata, ydata_stack, yerr_stack, p0, fixed, absolute_sigma, jac,
+                     n_jobs=n_jobs, chunksize=chunksize, **kwargs)
    
 
 def __main__():
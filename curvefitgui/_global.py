@@ -0,0 +1,209 @@
+"""
+Global fits: one model fitted simultaneously to several datasets with shared and per-dataset parameters
+"""
+import numpy as np
+from scipy.optimize import least_squares, OptimizeWarning
+from scipy.sparse import csr_matrix
+
+from ._tools import Fitter, FitCancelled, AutoJacobian, jacobian_covariance
+from ._ingest import as_data_array
+
+
+class GlobalFitter:
+    """
+    fits one model simultaneously to several datasets. The shared parameters have a single value for all
+    datasets, the other parameters have a value per dataset. Each dataset is held by a Fitter (see fitters),
+    which stores its parameter values, fitrange and results as for a single fit.
+    The fit solves one least squares problem for the stacked residuals of all datasets with a block-sparse
+    jacobian: the columns of the shared parameters span all datasets, the columns of the other parameters
+    only the rows of their own dataset.
+    xdata : list of 1D arrays, one per dataset, or one 1D numpy array shared by all datasets
+    ydata : list of 1D arrays (or 2D array), one per dataset
+    xerr, yerr : list of 1D arrays per dataset or None
+    p0 : initial values shared by all datasets or a 2D array with the initial values (ndatasets, n) per dataset
+    shared : names of the shared parameters
+    labels : names of the datasets, by default 'dataset 1', 'dataset 2', ...
+    method : 'trf' (default) or 'dogbox', the solvers of least_squares() that support a sparse jacobian
+    other arguments as for Fitter
+    """
+
+    SOLVEROPTIONS = ('trf', 'dogbox')
+
+    def __init__(self, func, xdata, ydata, xerr, yerr, p0, absolute_sigma, jac, shared=(), labels=None,
+                 bounds=None, method=None, **kwargs):
+        ndata = len(ydata)
+        if ndata == 0:
+            raise Exception('ydata should hold at least one dataset')
+        if isinstance(xdata, np.ndarray) and xdata.ndim == 1:
+            xdata = [xdata] * ndata  # x-values shared by all datasets
+        xerr = [None] * ndata if xerr is None else xerr
+        yerr = [None] * ndata if yerr is None else yerr
+        p0 = [p0] * ndata if p0 is None or np.ndim(p0) == 1 else p0
+        for name, var in (('xdata', xdata), ('xerr', xerr), ('yerr', yerr), ('p0', p0)):
+            if len(var) != ndata:
+                raise Exception(f'{name} should hold one entry per dataset')
+        if len({ye is None for ye in yerr}) > 1:
+            raise Exception('yerr should be given for all datasets or for none')
+        labels = [f'dataset {i + 1}' for i in range(ndata)] if labels is None else list(labels)
+        if len(labels) != ndata:
+            raise Exception('labels should hold one name per dataset')
+        datasets = []
+        for label, *data in zip(labels, xdata, ydata, xerr, yerr):
+            x, y, xe, ye = [None if var is None else as_data_array(var) for var in data]
+            for name, var in (('xdata', x), ('xerr', xe), ('yerr', ye)):
+                if var is not None and len(var) != len(y):
+                    raise Exception(f'{name} and ydata of {label} should be of equal length')
+            datasets.append((x, y, xe, ye))
+        if method is None:
+            method = self.SOLVEROPTIONS[0]
+        if method not in self.SOLVEROPTIONS:
+            raise Exception(f"method should be one of {', '.join(self.SOLVEROPTIONS)}")
+
+        self.fitters = [Fitter(func, x, y, xe, ye, p, absolute_sigma, jac, bounds=bounds, method=method, **kwargs)
+                        for (x, y, xe, ye), p in zip(datasets, p0)]
+        self.labels = labels
+
+        names = [par.name for par in self.fitters[0].model.fitpars]
+        for name in shared:
+            if name not in names:
+                raise Exception(f'{name} is not a parameter of the model')
+        self.shared = np.array([name in shared for name in names], dtype=bool)
+        self.func = func
+        self.jac = jac
+        self.kwargs = kwargs
+        self.fit_is_valid = False
+        self.pcov = None  # covariance of all fitted parameters of the last fit, see get_columns()
+        self.mean_squared_error = None
+        self.sync(0)
+
+    def sync(self, index):
+        """ copies the shared parameters (value, fixed and bounds), the weight and the solver of dataset index to all datasets """
+        source = self.fitters[index].model
+        for fitter in self.fitters:
+            fitter.model.weight, fitter.model.method = source.weight, source.method
+            for attribute in ('values', 'fixed', 'lower', 'upper'):
+                getattr(fitter.model, attribute)[self.shared] = getattr(source, attribute)[self.shared]
+
+    def get_columns(self):
+        """
+        returns an int array (ndatasets, n) with the column of each parameter in the global fit, -1 for
+        fixed parameters, and the number of columns. The free shared parameters come first, followed
+        by the free parameters of each dataset.
+        """
+        fixed = np.array([fitter.model.fixed for fitter in self.fitters])
+        columns = np.full(fixed.shape, -1)
+        shared = self.shared & ~fixed[0]
+        columns[:, shared] = np.arange(np.count_nonzero(shared))
+        local = ~self.shared & ~fixed
+        columns[local] = np.count_nonzero(shared) + np.arange(np.count_nonzero(local))  # row by row
+        return columns, np.count_nonzero(shared) + np.count_nonzero(local)
+
+    def fit(self, callback=None):
+        """
+        performs the global fit, the datasets use the weight and solver of the first dataset (see sync())
+        callback : optional function callback(nfev, pars) called before each evaluation of the stacked
+                   residuals, the fit is cancelled (FitCancelled is raised) if it returns True
+        returns the popt (ndatasets, n) and the pcov (ndatasets, n, n) of each dataset
+        """
+        model = self.fitters[0].model
+        columns, ncolumns = self.get_columns()
+        values = np.array([fitter.model.values for fitter in self.fitters])
+        data = [fitter.data.get() for fitter in self.fitters]
+        weighted = model.weight != Fitter.WEIGHTOPTIONS[0]
+        absolute_sigma = model.weight == Fitter.WEIGHTOPTIONS[2]
+        weights = [1. / ye if weighted else None for _, _, _, ye in data]
+        offsets = np.cumsum([0] + [len(y) for _, y, _, _ in data])
+        npoints = offsets[-1]
+
+        if ncolumns == 0:
+            raise OptimizeWarning('There should be at least one free fitparameter')
+        if npoints - ncolumns <= 0:
+            raise OptimizeWarning("The number of degrees of freedom (dof) should be at least one." + \
+                            " Try to increase the number of datapoints or to decrease the number of free fitparameters.")
+
+        free = columns >= 0
+        theta0 = np.empty(ncolumns)
+        theta0[columns[free]] = values[free]
+        lower, upper = np.empty(ncolumns), np.empty(ncolumns)
+        lower[columns[free]] = np.array([fitter.model.lower for fitter in self.fitters])[free]
+        upper[columns[free]] = np.array([fitter.model.upper for fitter in self.fitters])[free]
+
+        autojac = None if callable(self.jac) else AutoJacobian(self.func, self.jac if self.jac in AutoJacobian.METHODS else 'auto')
+        nfev = 0
+
+        def parameters(theta):
+            pars = values.copy()
+            pars[free] = theta[columns[free]]
+            return pars
+
+        def residuals(theta):
+            nonlocal nfev
+            nfev += 1
+            if callback is not None and callback(nfev, theta):
+                raise FitCancelled('The fit is cancelled')
+            pars = parameters(theta)
+            stacked = np.empty(npoints)
+            for i, ((x, y, _, _), weight) in enumerate(zip(data, weights)):
+                res = stacked[offsets[i]:offsets[i + 1]]
+                res[:] = self.func(x, *pars[i])
+                res -= y
+                if weight is not None:
+                    res *= weight
+            return stacked
+
+        def jacobian(theta):
+            pars = parameters(theta)
+            rows, cols, blocks = [], [], []
+            for i, ((x, _, _, _), weight) in enumerate(zip(data, weights)):
+                indices = np.flatnonzero(free[i])
+                if callable(self.jac):
+                    block = np.asarray(self.jac(x, *pars[i]), dtype=float).reshape(len(x), -1)[:, indices]
+                else:
+                    block = autojac(x, pars[i], indices)
+                if weight is not None:
+                    block = block * weight[:, np.newaxis]
+                rows.append(np.repeat(np.arange(offsets[i], offsets[i + 1]), len(indices)))
+                cols.append(np.tile(columns[i, indices], len(x)))
+                blocks.append(block.ravel())
+            return csr_matrix((np.concatenate(blocks), (np.concatenate(rows), np.concatenate(cols))),
+                              shape=(npoints, ncolumns))
+
+        options = {key: value for key, value in self.kwargs.items() if key in ('ftol', 'xtol', 'gtol', 'max_nfev', 'x_scale', 'loss', 'f_scale')}
+        if np.ndim(options.get('x_scale')) == 1:
+            x_scale = np.broadcast_to(options['x_scale'], values.shape)
+            options['x_scale'] = np.empty(ncolumns)
+            options['x_scale'][columns[free]] = x_scale[free]
+        if np.any(np.isfinite(lower)) or np.any(np.isfinite(upper)):
+            options['bounds'] = (lower, upper)
+        result = least_squares(residuals, theta0, jac=jacobian, method=model.method, **options)
+        if not result.success:
+            raise RuntimeError('Optimal parameters not found: ' + result.message)
+
+        # covariance of all fitted parameters from the jacobian at the optimum, as in curve_fit()
+        smin = np.dot(result.fun, result.fun)
+        pcov = jacobian_covariance(result.jac, smin, absolute_sigma)
+
+        # store the results per dataset
+        popt = parameters(result.x)
+        pcovs = np.zeros((len(self.fitters), popt.shape[1], popt.shape[1]))
+        for i, fitter in enumerate(self.fitters):
+            indices = np.flatnonzero(free[i])
+            pcovs[i][np.ix_(indices, indices)] = pcov[np.ix_(columns[i, indices], columns[i, indices])]
+            fvec = result.fun[offsets[i]:offsets[i + 1]]
+            fitter._set_result(popt[i], pcovs[i], np.dot(fvec, fvec))
+            if fitter.data.get_numfitpoints() == len(fitter.data.x):
+                fitter._fit_residuals = (tuple(popt[i]), -fvec if weights[i] is None else -fvec / weights[i])
+        self.fit_is_valid = True
+        self.pcov = pcov
+        self.mean_squared_error = smin
+        report = {
+                    'datasets'           : len(self.fitters),
+                    'shared'             : ', '.join(par.name for par, shared in zip(model.fitpars, self.shared) if shared),
+                    'N'                  : int(npoints),
+                    'dof'                : int(npoints - ncolumns),
+                    'Smin'               : smin
+                 }
+        for fitter in self.fitters:
+            fitter.fitreport['GLOBALFIT'] = report
+        return popt, pcovs
+
@@ -1,31 +1,108 @@
 # import the required packages
-import warnings
 import sys
+import time
+import numpy as np
 from scipy.optimize import OptimizeWarning
 from ._qt_compat import (
     QtWidgets, QtCore, exec_dialog, exec_app
 )
 
 
-from ._tools import Fitter, value_to_string
-from ._widgets import PlotWidget, ModelWidget, ReportWidget
+from ._tools import Fitter, FitCancelled, value_to_string
+from ._global import GlobalFitter
+from ._widgets import PlotWidget, ModelWidget, ReportWidget, LandscapeWidget
 from ._settings import settings
 from ._version import __version__ as CFGversion
 
 
 
+class FitThread(QtCore.QThread):
+    """ 
+    performs a fit task on a worker thread and reports the progress and the result by signals 
+    task : function task(callback) that returns the result, see Fitter.fit() for the callback
+    """
+
+    progress = QtCore.pyqtSignal(int, float)  # progress count (e.g. function evaluations) and elapsed time
+    fitted = QtCore.pyqtSignal(object)  # the result of the task
+    failed = QtCore.pyqtSignal(str)  # error message
+    cancelled = QtCore.pyqtSignal()
+
+    PROGRESS_INTERVAL = 0.1  # minimum time in seconds between progress signals
+
+    def __init__(self, task):
+        super(FitThread, self).__init__()
+        self.task = task
+        self._cancel = False
+        self._start = None
+        self._last_progress = 0.
+
+    def cancel(self):
+        """ requests to stop the fit, which happens at the next evaluation of the model """
+        self._cancel = True
+
+    def _callback(self, nfev, pars):
+        now = time.perf_counter()
+        if now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progress.emit(nfev, now - self._start)
+        return self._cancel
+
+    def run(self):
+        self._start = time.perf_counter()
+        try:
+            result = self.task(self._callback)
+        except FitCancelled:
+            self.cancelled.emit()
+        except (ValueError, RuntimeError, OptimizeWarning):
+            self.failed.emit(str(sys.exc_info()[1]))
+        except Exception:
+            # an error in the fit function should not silently end the worker thread
+            error = sys.exc_info()[1]
+            self.failed.emit(f'{type(error).__name__}: {error}')
+        else:
+            self.fitted.emit(result)
+
+
+class PreviewWorker(QtCore.QObject):
+    """ computes the model curve and residuals for the live preview on a worker thread """
+
+    computed = QtCore.pyqtSignal(int, object, object)  # request number, fitline and residuals
+
+    def __init__(self, afitter):
+        super(PreviewWorker, self).__init__()
+        self.fitter = afitter
+        self.latest = 0  # number of the latest request, older requests are skipped
+
+    def compute(self, request, pars):
+        if request != self.latest:
+            return
+        with np.errstate(all='ignore'):  # e.g. overflow for unreasonable parameter values
+            try:
+                fitline = self.fitter.get_curve(pars=pars)
+                residuals = self.fitter.get_residuals(check=False, pars=pars)
+            except Exception:
+                return  # the preview is skipped for values the model cannot handle
+        self.computed.emit(request, fitline, residuals)
+
+
 class MainWindow(QtWidgets.QMainWindow):
+
+    preview_requested = QtCore.pyqtSignal(int, object)  # request number and parameter values
     
     def __init__(self, afitter, xlabel, ylabel):    
         super(MainWindow , self).__init__()
         
-        # perform some initial default settings
-        self.fitter = afitter
+        # perform some initial default settings, for a GlobalFitter the fitter is the one of the shown dataset
+        self.globalfitter = afitter if isinstance(afitter, GlobalFitter) else None
+        self.fitter = afitter if self.globalfitter is None else afitter.fitters[0]
         self.xlabel, self.ylabel = xlabel, ylabel   
         self.output = (None, None)
         self.xerrorwarning = settings['XERRORWARNING']
+        self.fitthread = None  # worker thread of a running fit
+        self.gui_timings = {}  # durations of the gui stages before the last fit
 
         self.initGUI()
+        self.initPreview()
         
         self.plotwidget.update_plot()
         
@@ -33,6 +110,11 @@ class MainWindow(QtWidgets.QMainWindow):
     
     def closeEvent(self, event):
         """needed to properly quit when running in IPython console / Spyder IDE"""
+        if self.fitthread is not None:
+            self.fitthread.cancel()
+            self.fitthread.wait()
+        self.previewthread.quit()
+        self.previewthread.wait()
         QtWidgets.QApplication.quit()
         
 
@@ -46,24 +128,69 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setCentralWidget(self._main)
 
         # creating the required widgets
-        self.plotwidget = PlotWidget(self.fitter.data, self.xlabel, self.ylabel)  # holds the plot
-        self.modelview = ModelWidget(self.fitter.model, self.fitter.get_weightoptions())  # shows the model and allows users to set fitproperties
+        labels = None if self.globalfitter is None else self.globalfitter.labels
+        self.plotwidget = PlotWidget(self.fitter.data, self.xlabel, self.ylabel, labels)  # holds the plot
+        solveroptions = self.fitter.get_solveroptions() if self.globalfitter is None else self.globalfitter.SOLVEROPTIONS
+        self.modelview = ModelWidget(self.fitter.model, self.fitter.get_weightoptions(), solveroptions)  # shows the model and allows users to set fitproperties
         self.fitbutton = QtWidgets.QPushButton('FIT', clicked = self.fit) 
         self.evalbutton = QtWidgets.QPushButton('EVALUATE', clicked = self.evaluate) 
+        self.cancelbutton = QtWidgets.QPushButton('CANCEL', clicked = self.cancel_fit)
+        self.cancelbutton.setEnabled(False)
+        self.previewcheck = QtWidgets.QCheckBox('live preview', toggled = self.toggle_preview)
+        self.startsbox = QtWidgets.QSpinBox()  # number of initial values of the fit (multi-start)
+        self.startsbox.setRange(1, 100000)
+        self.startsbox.setValue(settings['MULTISTART_STARTS'])
+        self.startsbox.setToolTip('number of initial values sampled around the current values, the best fit is kept')
         self.reportview = ReportWidget()  # shows the fitresults
+        self.landscapeview = LandscapeWidget([par.name for par in self.fitter.model.fitpars], ('fixed', 'profile'))  # shows profiles and maps of Smin
+        self.landscapeview.requested.connect(self.compute_landscape)
+        self.resultstabs = QtWidgets.QTabWidget()
+        self.resultstabs.addTab(self.reportview, 'Report')
+        self.resultstabs.addTab(self.landscapeview, 'Landscape')
+
+        # controls to estimate the uncertainty by resampling
+        self.bootstrapbox = QtWidgets.QGroupBox('Resampling uncertainty')
+        self.bootstrapmethod = QtWidgets.QComboBox()
+        self.bootstrapmethod.addItems(self.fitter.BOOTSTRAPMETHODS)
+        self.bootstrapsamples = QtWidgets.QSpinBox()
+        self.bootstrapsamples.setRange(10, 100000)
+        self.bootstrapsamples.setValue(settings['BOOTSTRAP_SAMPLES'])
+        self.bootstrapbutton = QtWidgets.QPushButton('BOOTSTRAP', clicked = self.bootstrap)
+        bootstraplayout = QtWidgets.QHBoxLayout()
+        bootstraplayout.addWidget(QtWidgets.QLabel('method:'))
+        bootstraplayout.addWidget(self.bootstrapmethod)
+        bootstraplayout.addWidget(QtWidgets.QLabel('samples:'))
+        bootstraplayout.addWidget(self.bootstrapsamples)
+        bootstraplayout.addWidget(self.bootstrapbutton)
+        self.bootstrapbox.setLayout(bootstraplayout)
         self.quitbutton = QtWidgets.QPushButton('QUIT', clicked = self.close)
 
+        # a global fit shows one dataset at a time, multi-start and resampling apply to single fits only
+        if self.globalfitter is not None:
+            self.plotwidget.dataset_changed.connect(self.select_dataset)
+            for parview, shared in zip(self.modelview.parviews, self.globalfitter.shared):
+                if shared:
+                    parview.label.setText(parview.par.name + ' (shared)')
+            self.startsbox.setValue(1)
+            self.startsbox.setEnabled(False)
+            self.bootstrapbox.hide()
+            self.resultstabs.removeTab(self.resultstabs.indexOf(self.landscapeview))
+
         # create a layout for the buttons
         self.buttons = QtWidgets.QGroupBox()
         buttonslayout = QtWidgets.QHBoxLayout()
         buttonslayout.addWidget(self.evalbutton)
         buttonslayout.addWidget(self.fitbutton)
+        buttonslayout.addWidget(self.cancelbutton)
+        buttonslayout.addWidget(QtWidgets.QLabel('starts:'))
+        buttonslayout.addWidget(self.startsbox)
+        buttonslayout.addWidget(self.previewcheck)
         self.buttons.setLayout(buttonslayout)
 
         # create a frame with a vertical layout to organize the modelview, fitbutton and reportview
         self.fitcontrolframe = QtWidgets.QGroupBox()
         fitcontrollayout = QtWidgets.QVBoxLayout()
-        for widget in (self.modelview, self.buttons, self.reportview, self.quitbutton):
+        for widget in (self.modelview, self.buttons, self.bootstrapbox, self.resultstabs, self.quitbutton):
             fitcontrollayout.addWidget(widget)
         self.fitcontrolframe.setLayout(fitcontrollayout)
         
@@ -73,8 +200,72 @@ class MainWindow(QtWidgets.QMainWindow):
         splitter.addWidget(self.plotwidget)
         splitter.addWidget(self.fitcontrolframe)
         mainlayout.addWidget(splitter)
+
+        # a busy indicator in the statusbar shown while fitting
+        self.progressbar = QtWidgets.QProgressBar()
+        self.progressbar.setRange(0, 0)
+        self.progressbar.setMaximumWidth(200)
+        self.progressbar.hide()
+        self.statusBar().addPermanentWidget(self.progressbar)
                 
       
+    def initPreview(self):
+        """ sets up the live preview: throttled requests computed on a worker thread """
+        self.preview_time = 0.  # time of the last request
+        self.preview_shown = 0  # number of the last request shown
+        self.previewtimer = QtCore.QTimer()
+        self.previewtimer.setSingleShot(True)
+        self.previewtimer.setInterval(settings['PREVIEW_DELAY'])
+        self.previewtimer.timeout.connect(self._request_preview)
+        self.modelview.changed.connect(self._schedule_preview)
+
+        self.previewthread = QtCore.QThread()
+        self.previewworker = PreviewWorker(self.fitter)
+        self.previewworker.moveToThread(self.previewthread)
+        self.preview_requested.connect(self.previewworker.compute)
+        self.previewworker.computed.connect(self._show_preview)
+        self.previewthread.start()
+
+    def toggle_preview(self, enabled):
+        """ switches the live preview mode on or off """
+        self.modelview.set_preview(enabled)
+        if enabled:
+            self.reportview.update_report({})
+            self.plotwidget.canvas.start_preview()
+            self._request_preview()
+        else:
+            self.previewtimer.stop()
+            self.plotwidget.canvas.end_preview()
+
+    def _schedule_preview(self):
+        """ 
+        requests a preview at once if the last request is shown or older than the delay, so the preview follows
+        a dragged slider, otherwise (re)starts the timer so that the last value is shown once the user pauses
+        """
+        if not self.previewcheck.isChecked():
+            return
+        pending = self.preview_shown < self.previewworker.latest
+        if not pending or time.perf_counter() - self.preview_time >= settings['PREVIEW_DELAY'] / 1000:
+            self.previewtimer.stop()
+            self._request_preview()
+        else:
+            self.previewtimer.start()
+
+    def _request_preview(self):
+        try:
+            pars = self.modelview.get_values()
+        except ValueError:
+            return  # incomplete input while typing
+        self.preview_time = time.perf_counter()
+        self.previewworker.latest += 1
+        self.preview_requested.emit(self.previewworker.latest, pars)
+
+    def _show_preview(self, request, fitline, residuals):
+        # a result newer than the one shown is shown even if newer requests are pending, so a slow model still updates
+        if request > self.preview_shown and self.previewcheck.isChecked():
+            self.preview_shown = request
+            self.plotwidget.canvas.show_preview(fitline, residuals)
+
     def showdialog(self, message, icon, info='', details=''):
         """ shows an info dialog """
        
@@ -109,6 +300,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # evaluate
         self.reportview.update_report({})
         self.plotwidget.canvas.set_fitline(self.fitter.get_curve())
+        self.plotwidget.canvas.set_bands(None)
         self.plotwidget.canvas.set_residuals(self.fitter.get_residuals(check=False))
         self.plotwidget.canvas.disable_results_box()
         self.plotwidget.update_plot()
@@ -117,6 +309,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def fit(self):
         """ updates the model performs the fit and updates the widgets with the results """
         # update the modelvalues from userinput 
+        start = time.perf_counter()
         try:
             self.modelview.read_values()
         except ValueError:
@@ -124,32 +317,170 @@ class MainWindow(QtWidgets.QMainWindow):
             return None
         
         # update fitrange 
+        ranged = time.perf_counter()
         self.plotwidget.canvas.get_range()
+        self.gui_timings = {'read values': ranged - start, 'fitrange': time.perf_counter() - ranged}
 
         # show warning on xerror data
-        if (self.fitter.data.xe is not None) and self.xerrorwarning:
+        if (self.fitter.data.xe is not None) and self.xerrorwarning and self.fitter.model.method != 'odr':
             self.showdialog('The error in x is ignored in the fit!', 'warning')
             self.xerrorwarning = False
 
-        # perform the fit
-        with warnings.catch_warnings():
-            warnings.simplefilter("error", OptimizeWarning)  # make sure the OptimizeWarning is raised as an exception
-            try:
-                fitpars, fitcov = self.fitter.fit()
-            except (ValueError, RuntimeError, OptimizeWarning):
-                self.showdialog(str(sys.exc_info()[1]), 'critical')
+        # perform the fit on a worker thread, the widgets are updated when the fit is finished
+        nstarts = self.startsbox.value()
+        if self.globalfitter is not None:
+            self.globalfitter.sync(self.globalfitter.fitters.index(self.fitter))
+            self._start_task(lambda callback: self.globalfitter.fit(callback=callback), self._fit_finished,
+                             'function evaluations')
+        elif nstarts > 1:
+            self._start_task(lambda callback: self.fitter.multistart(nstarts, sampler=settings['MULTISTART_SAMPLER'], 
+                                                                     agree=settings['MULTISTART_AGREE'], 
+                                                                     n_jobs=settings['MULTISTART_NJOBS'], callback=callback),
+                             self._fit_finished, f'of {nstarts} starts fitted')
+        else:
+            self._start_task(lambda callback: self.fitter.fit(callback=callback), self._fit_finished,
+                             'function evaluations')
+
+    def bootstrap(self):
+        """ estimates the uncertainty of the fitparameters by refitting resampled data """
+        if not self.fitter.fit_is_valid:
+            self.showdialog('Perform a fit first', 'warning')
+            return None
+        method = self.bootstrapmethod.currentText()
+        nsamples = self.bootstrapsamples.value()
+        self._start_task(lambda callback: self.fitter.bootstrap(nsamples, method, n_jobs=settings['BOOTSTRAP_NJOBS'],
+                                                                 callback=callback),
+                         self._bootstrap_finished, f'of {nsamples} resamples refitted')
+
+    def compute_landscape(self, request):
+        """ computes the profile or map of Smin requested by the landscapeview, see Landscape """
+        if self.fitthread is not None:
+            return None  # the view of the landscape changed during a fit
+        try:
+            landscape = self.fitter.get_landscape()
+        except Exception as error:
+            self.showdialog(str(error), 'warning')
+            return None
+        index1, index2 = request['index1'], request['index2']
+        numpoints, mode = request['numpoints'], request['mode']
 
+        def task(callback):
+            if index2 is None:
+                values1, smin = landscape.profile(index1, *request['range1'], numpoints, mode, 
+                                                  n_jobs=settings['LANDSCAPE_NJOBS'], callback=callback)
+                values2, popt = None, landscape.popt[index1]
             else:
-                # update output 
-                self.set_output((fitpars, fitcov))
+                values1, values2, smin = landscape.map(index1, index2, request['range1'], request['range2'], numpoints, 
+                                                       mode, n_jobs=settings['LANDSCAPE_NJOBS'], callback=callback)
+                popt = landscape.popt[[index1, index2]]
+            return request, popt, values1, values2, landscape.delta(smin)
+
+        self._start_task(task, self._landscape_finished, 'grid points computed')
+
+    def _landscape_finished(self, result):
+        self.landscapeview.show_grid(*result)
+        self.statusBar().showMessage('landscape computed', 5000)
+
+    def _start_task(self, task, on_result, progress_label):
+        """ runs task on a worker thread, on_result is called with the result when the task is finished """
+        self.progress_label = progress_label
+        self.fitthread = FitThread(task)
+        self.fitthread.progress.connect(self._fit_progress)
+        self.fitthread.fitted.connect(on_result)
+        self.fitthread.failed.connect(self._fit_failed)
+        self.fitthread.cancelled.connect(self._fit_cancelled)
+        self.fitthread.finished.connect(self._fit_done)
+        self._set_fitting(True)
+        self.fitthread.start()
+
+    def cancel_fit(self):
+        """ cancels a running fit """
+        if self.fitthread is not None:
+            self.fitthread.cancel()
+            self.statusBar().showMessage('cancelling fit...')
+
+    def _set_fitting(self, fitting):
+        """ enables or disables the controls while a fit is running """
+        for widget in (self.fitbutton, self.evalbutton, self.startsbox, self.modelview, self.previewcheck, self.bootstrapbox,
+                       self.landscapeview):
+            widget.setEnabled(not fitting)
+        self.cancelbutton.setEnabled(fitting)
+        self.progressbar.setVisible(fitting)
+        if fitting:
+            self.statusBar().showMessage('fitting...')
+
+    def _fit_progress(self, count, elapsed):
+        self.statusBar().showMessage(f'fitting... {count} {self.progress_label}, {elapsed:.1f} s')
+
+    def _fit_finished(self, result):
+        fitpars, fitcov = result
+        if not np.all(np.isfinite(fitcov)):
+            # the solvers only warn about a missing covariance, the gui treats it as a failed fit
+            fitters = [self.fitter] if self.globalfitter is None else [self.globalfitter] + self.globalfitter.fitters
+            for fitter in fitters:
+                fitter.fit_is_valid = False
+            self._fit_failed('Covariance of the parameters could not be estimated')
+            return
+
+        # update output 
+        self.set_output((fitpars, fitcov))
+
+        # update the widgets, the gui stages are added to the timings of an instrumented fit
+        start = time.perf_counter()
+        self._show_results()
+        if self.fitter.timings is not None:
+            self.fitter.add_timings(dict(self.gui_timings, redraw=time.perf_counter() - start))
+            self.reportview.update_report(self.fitter.get_report())
+        self.statusBar().showMessage('fit finished', 5000)
+
+    def _show_results(self):
+        """ shows the fitresults of the fitter in the widgets """
+        self.modelview.update_values()
+        self.reportview.update_report(self.fitter.get_report())
+        self.landscapeview.clear()
+        self.plotwidget.canvas.set_fitline(self.fitter.get_fitcurve())
+        if settings['BANDS_SHOW'] != 'none':
+            self.plotwidget.canvas.set_bands(self.fitter.get_bands(level=settings['BANDS_LEVEL']))
+        self.plotwidget.canvas.set_residuals(self.fitter.get_residuals())
+        self.plotwidget.canvas.set_results_box(self._get_result_box_text(), 2)
+        self.plotwidget.update_plot() 
+
+    def select_dataset(self, index):
+        """ shows the dataset index of a global fit, the shared parameters entered by the user are kept """
+        try:
+            self.modelview.read_values()
+            self.globalfitter.sync(self.globalfitter.fitters.index(self.fitter))
+        except ValueError:
+            pass  # invalid input is discarded
+        self.plotwidget.canvas.get_range()
+        self.fitter = self.globalfitter.fitters[index]
+        self.previewworker.fitter = self.fitter
+        self.plotwidget.set_data(self.fitter.data)
+        self.modelview.set_model(self.fitter.model)
+        if self.fitter.fit_is_valid:
+            self._show_results()
+        else:
+            self.reportview.update_report({})
+            self.plotwidget.canvas.disable_results_box()
+            self.plotwidget.update_plot()
+        if self.previewcheck.isChecked():
+            self.plotwidget.canvas.start_preview()
+            self._request_preview()
+
+    def _bootstrap_finished(self, samples):
+        self.reportview.update_report(self.fitter.get_report())
+        self.statusBar().showMessage('bootstrap finished', 5000)
 
-                # update the widgets
-                self.modelview.update_values()
-                self.reportview.update_report(self.fitter.get_report())
-                self.plotwidget.canvas.set_fitline(self.fitter.get_fitcurve())
-                self.plotwidget.canvas.set_residuals(self.fitter.get_residuals())
-                self.plotwidget.canvas.set_results_box(self._get_result_box_text(), 2)
-                self.plotwidget.update_plot() 
+    def _fit_failed(self, message):
+        self.statusBar().clearMessage()
+        self.showdialog(message, 'critical')
+
+    def _fit_cancelled(self):
+        self.statusBar().showMessage('fit cancelled', 5000)
+
+    def _fit_done(self):
+        self.fitthread = None
+        self._set_fitting(False)
 
     def _get_result_box_text(self):
         text = 'Fit results:'
@@ -171,7 +502,23 @@ def execute_gui(f, xdata, ydata, xerr, yerr, p0, xlabel, ylabel,
     afitter = Fitter(f, xdata, ydata, xerr, yerr, p0, absolute_sigma, jac,**kwargs)
     if not showgui:
         return afitter.fit()
-    
+    return show_gui(afitter, xlabel, ylabel)
+
+
+def execute_global_gui(f, xdata, ydata, xerr, yerr, p0, shared, labels, xlabel, ylabel,
+                       absolute_sigma, jac, showgui, **kwargs):
+    """
+    helper function that executes the GUI with an instance of the GlobalFitter class 
+    """
+
+    afitter = GlobalFitter(f, xdata, ydata, xerr, yerr, p0, absolute_sigma, jac, shared, labels, **kwargs)
+    if not showgui:
+        return afitter.fit()
+    return show_gui(afitter, xlabel, ylabel)
+
+
+def show_gui(afitter, xlabel, ylabel):
+    """ shows the GUI for the Fitter or GlobalFitter afitter and returns the output when it is closed """
     if not QtWidgets.QApplication.instance():
         app = QtWidgets.QApplication([])
     else:
@@ -0,0 +1,73 @@
+"""
+Ingestion of data that does not fit in memory: memory-mapped arrays, .npy files and chunked iterators
+"""
+import os
+import tempfile
+import weakref
+import numpy as np
+
+
+CHUNKSIZE = 2**20  # number of datapoints processed at once by the chunked computations
+
+
+def as_data_array(var):
+    """
+    returns var as a numpy array without copying the data
+    var : numpy array (including np.memmap), path of a .npy file, which is opened memory-mapped,
+          or an iterator of 1D chunks, which is spooled to a temporary memory-mapped file
+    raises an Exception for other types
+    """
+    if isinstance(var, np.ndarray):
+        return var
+    if isinstance(var, (str, os.PathLike)):
+        return np.load(var, mmap_mode='r')
+    if hasattr(var, '__next__'):
+        return spool(var)
+    raise Exception('data should have type numpy array, be the path of a .npy file or an iterator of chunks')
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass  # still mapped (Windows), left to the system to clean up
+
+
+def spool(chunks, dtype=float):
+    """ writes an iterator of 1D chunks to a temporary file and returns the data as a read-only np.memmap """
+    with tempfile.NamedTemporaryFile(prefix='curvefitgui-', suffix='.dat', delete=False) as file:
+        npoints = 0
+        for chunk in chunks:
+            chunk = np.ascontiguousarray(chunk, dtype=dtype).ravel()
+            file.write(chunk.data)
+            npoints += len(chunk)
+    if npoints == 0:
+        _remove(file.name)
+        return np.empty(0, dtype=dtype)
+    data = np.memmap(file.name, dtype=dtype, mode='r', shape=(npoints,))
+    weakref.finalize(data, _remove, file.name)
+    return data
+
+
+def empty_like_data(data, dtype=float):
+    """ returns an empty array of the length of data, memory-mapped to a temporary file if data is memory-mapped """
+    if not isinstance(data, np.memmap):
+        return np.empty(len(data), dtype=dtype)
+    with tempfile.NamedTemporaryFile(prefix='curvefitgui-', suffix='.dat', delete=False) as file:
+        pass
+    out = np.memmap(file.name, dtype=dtype, mode='w+', shape=(len(data),))
+    weakref.finalize(out, _remove, file.name)
+    return out
+
+
+def chunks(npoints, chunksize=CHUNKSIZE):
+    """ returns slices that divide npoints datapoints into chunks """
+    return [slice(start, min(start + chunksize, npoints)) for start in range(0, npoints, chunksize)]
+
+
+def is_sorted(x):
+    """ returns True if the values in x are in increasing order, checked chunk by chunk """
+    for chunk in chunks(len(x) - 1):
+        if not np.all(x[chunk.start + 1:chunk.stop + 1] >= x[chunk]):
+            return False
+    return True
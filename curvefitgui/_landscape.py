@@ -0,0 +1,154 @@
+"""
+The landscape of the chi-square Smin around the result of a fit: 1D profiles and 2D maps on cached grids
+"""
+import numpy as np
+
+from ._tools import batch_fit, FitCancelled, FIT_NOCOV
+from ._parallel import WorkerPool
+from ._ingest import chunks
+
+
+def _lattice_key(k, level):
+    """ returns the key (k, level) of the lattice point k * 2**-level in its shortest form, so equal points have equal keys """
+    if k == 0:
+        return (0, 0)
+    while k % 2 == 0:
+        k, level = k // 2, level - 1
+    return (k, level)
+
+
+class Landscape:
+    """
+    computes Smin on grids of the values of one parameter (profile()) or a pair of parameters (map())
+    around the fitted values popt. The other parameters are
+        'fixed'   : kept at their fitted values, all grid points are evaluated at once with FitModel.evaluate_batch()
+        'profile' : re-optimised at each grid point (profile likelihood), the refits are performed by batch_fit(),
+                    spread over n_jobs worker processes
+    The grid points are taken from a lattice with the spacing sigma / 2**level around the fitted value of each
+    parameter, where the level follows from the range and the number of points. The grid of a zoomed range
+    therefore contains the points of the coarser grids computed before, and only the new points are evaluated:
+    Smin of all computed points is cached.
+    model : the FitModel, with the values of the fixed parameters in popt
+    x, y, sigma : the (masked) data of the fit, sigma is None for unweighted fits
+    pcov : covariance of the fit, the standard errors set the spacing of the lattice
+    options : keyword arguments of the refits, see Fitter._solver_options()
+    """
+
+    MODES = ('fixed', 'profile')
+    RANGE = 3.  # default range of a grid: the fitted value +- RANGE standard errors
+    BLOCKSIZE = 2**22  # maximum number of model values computed at once in the fixed mode
+    REFITS = 64  # number of refits per worker and call of batch_fit() in the profile mode
+
+    def __init__(self, model, x, y, sigma, popt, pcov, absolute_sigma=False, options=None):
+        self.model = model
+        self.x, self.y, self.sigma = x, y, sigma
+        self.popt = np.array(popt, dtype=float)
+        self.pF = model.fixed.copy()
+        self.options = {} if options is None else dict(options)
+        self.absolute_sigma = absolute_sigma
+
+        # the spacing of the lattice, the errors that could not be estimated are replaced by a tenth of the value
+        with np.errstate(invalid='ignore'):
+            scale = np.sqrt(np.diag(pcov))
+        fallback = 0.1 * np.maximum(np.abs(self.popt), 1.)
+        self.scale = np.where(np.isfinite(scale) & (scale > 0), scale, fallback)
+
+        self.smin = self._chi_square(self.popt[np.newaxis])[0]
+        self.dof = len(y) - int(np.count_nonzero(~self.pF))
+        self._cache = {}  # Smin per (mode, indices, lattice keys)
+
+    def delta(self, smin):
+        """ returns the increase of Smin with respect to the fit, in units of the reduced chi-square unless absolute_sigma """
+        noise = 1. if self.absolute_sigma else self.smin / self.dof
+        return (np.asarray(smin) - self.smin) / noise
+
+    def grid(self, index, lower=None, upper=None, numpoints=41):
+        """
+        returns the lattice keys and the values of a grid of at least numpoints values of the parameter index from
+        lower to upper, by default the fitted value +- RANGE standard errors
+        """
+        origin, scale = self.popt[index], self.scale[index]
+        if lower is None: lower = origin - self.RANGE * scale
+        if upper is None: upper = origin + self.RANGE * scale
+        if not upper > lower or numpoints < 2:
+            raise Exception('A grid requires a range with upper > lower and at least two points')
+        # the tolerance keeps the level and the end points of a range that lies on the lattice, such as a zoomed range
+        level = int(np.ceil(np.log2(scale * (numpoints - 1) / (upper - lower)) - 1e-9))
+        step = scale * 2.**-level
+        keys = [_lattice_key(int(k), level) for k in np.arange(np.ceil((lower - origin) / step - 1e-9),
+                                                              np.floor((upper - origin) / step + 1e-9) + 1)]
+        return keys, np.array([self._value(index, key) for key in keys])
+
+    def _value(self, index, key):
+        """ returns the value of the parameter index at the lattice point key """
+        k, level = key
+        return self.popt[index] + k * self.scale[index] * 2.**-level
+
+    def profile(self, index, lower=None, upper=None, numpoints=41, mode='fixed', n_jobs=1, callback=None):
+        """
+        returns the values of the parameter index and Smin at these values, see grid() for the range
+        callback : optional function callback(ndone, None) called after each block of grid points, the
+                   computation is cancelled (FitCancelled is raised) if it returns True
+        """
+        keys, values = self.grid(index, lower, upper, numpoints)
+        return values, self._evaluate((index,), [(key,) for key in keys], mode, n_jobs, callback)
+
+    def map(self, index1, index2, range1=(None, None), range2=(None, None), numpoints=41, mode='fixed', n_jobs=1,
+            callback=None):
+        """
+        returns the values of the parameters index1 and index2 and Smin (len(values2), len(values1)) on the grid
+        of both, see grid() for the ranges and profile() for the callback
+        """
+        if index1 == index2:
+            raise Exception('A map requires two different parameters')
+        keys1, values1 = self.grid(index1, *range1, numpoints)
+        keys2, values2 = self.grid(index2, *range2, numpoints)
+        smin = self._evaluate((index1, index2), [(key1, key2) for key2 in keys2 for key1 in keys1], mode, n_jobs, callback)
+        return values1, values2, smin.reshape(len(values2), len(values1))
+
+    def _evaluate(self, indices, keys, mode, n_jobs, callback):
+        """ returns Smin at the lattice points keys of the parameters indices, only the points not cached are computed """
+        if mode not in self.MODES:
+            raise Exception(f"mode should be one of {', '.join(self.MODES)}")
+        for index in indices:
+            if self.pF[index]:
+                raise Exception(f'{self.model.fitpars[index].name} is fixed')
+        missing = list(dict.fromkeys(key for key in keys if (mode, indices, key) not in self._cache))
+        pars = np.tile(self.popt, (len(missing), 1))
+        for column, index in enumerate(indices):
+            pars[:, index] = [self._value(index, key[column]) for key in missing]
+
+        # the fixed mode computes all points at once, the profile mode refits in blocks to report progress
+        refit = mode == 'profile' and np.count_nonzero(~self.pF) > len(indices)
+        with WorkerPool(n_jobs if refit else 1) as pool:  # the worker processes are reused by all blocks
+            blocksize = self.REFITS * pool.n_jobs if refit else max(1, len(missing))
+            for start in range(0, len(missing), blocksize):
+                block = slice(start, start + blocksize)
+                smin = self._refit(pars[block], indices, pool) if refit else self._chi_square(pars[block])
+                for key, value in zip(missing[block], smin):
+                    self._cache[(mode, indices, key)] = value
+                if callback is not None and callback(start + len(smin), None):
+                    raise FitCancelled('The computation is cancelled')
+        return np.array([self._cache[(mode, indices, key)] for key in keys])
+
+    def _refit(self, pars, indices, pool):
+        """ returns Smin after refitting the other free parameters from each row of pars, nan if a refit fails """
+        pF = self.pF.copy()
+        pF[list(indices)] = True
+        popt, _, status = batch_fit(self.model.func, self.x, self.y, self.sigma, p0=pars, pF=pF,
+                                    absolute_sigma=self.absolute_sigma, jac=self.model.jac, pool=pool, **self.options)
+        return np.where(status <= FIT_NOCOV, self._chi_square(np.nan_to_num(popt)), np.nan)
+
+    def _chi_square(self, pars):
+        """ returns Smin for each row of parameter values in pars, computed in blocks of the data and the rows """
+        smin = np.zeros(len(pars))
+        with np.errstate(all='ignore'):
+            for chunk in chunks(len(self.y)):
+                x, y = self.x[chunk], self.y[chunk]
+                rows = max(1, self.BLOCKSIZE // len(y))
+                for start in range(0, len(pars), rows):
+                    residuals = y - self.model.evaluate_batch(x, pars[start:start + rows])
+                    if self.sigma is not None:
+                        residuals /= self.sigma[chunk]
+                    smin[start:start + rows] += np.einsum('ij,ij->i', residuals, residuals)
+        return smin
@@ -0,0 +1,122 @@
+"""
+Models that are linear in their parameters and their direct least squares solution
+"""
+import inspect
+import warnings
+import numpy as np
+from scipy.optimize import OptimizeWarning
+
+from ._ingest import chunks
+
+
+class LinearModel:
+    """
+    model that is linear in its parameters: f(x, *pars) = basis(x) @ pars
+    a LinearModel is called as any fit function and is fitted by linear_fit() instead of an iterative solver
+    basis : function basis(x) that returns the design matrix of shape (len(x), n), define it at module level
+            to allow parallel fitting
+    names : the names of the n parameters
+    description : description of the model shown in the report
+    """
+
+    def __init__(self, basis, names, description=''):
+        self.basis = basis
+        self.names = list(names)
+        self.__doc__ = description
+        self.__signature__ = inspect.Signature([inspect.Parameter(name, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+                                                for name in ['x'] + self.names])
+
+    broadcasts = True  # evaluates arrays of parameter values, e.g. of shape (nsets, 1), in one call
+
+    def __call__(self, x, *pars):
+        basis = self.basis(x)
+        if all(np.ndim(par) == 0 for par in pars):
+            return basis @ np.asarray(pars)
+        return sum(column * par for column, par in zip(basis.T, pars))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({getattr(self.basis, '__qualname__', self.basis)!r}, {self.names!r})"
+
+
+class PolynomialModel(LinearModel):
+    """ polynomial a0 + a1 * x + ... + an * x**n of degree n """
+
+    def __init__(self, degree):
+        self.degree = int(degree)
+        terms = ' + '.join(['a0'] + [f'a{i} * x' + (f'**{i}' if i > 1 else '') for i in range(1, self.degree + 1)])
+        super().__init__(self._vander, [f'a{i}' for i in range(self.degree + 1)],
+                         f'Polynomial fit\ny = {terms}')
+
+    def _vander(self, x):
+        return np.vander(x, self.degree + 1, increasing=True)
+
+    def __call__(self, x, *pars):
+        # Horner's scheme, broadcasts over arrays of parameter values
+        y = pars[-1] + 0 * x
+        for par in pars[-2::-1]:
+            y = y * x + par
+        return y
+
+    def __repr__(self):
+        return f'PolynomialModel({self.degree})'
+
+    def __reduce__(self):
+        return (PolynomialModel, (self.degree,))
+
+
+def _line_basis(x):
+    return np.column_stack((x, np.ones_like(x)))
+
+
+def line_model():
+    """ returns the LinearModel y = ax + b used by linear_fit_gui() """
+    return LinearModel(_line_basis, ['a', 'b'], 'Linear fit\ny = ax + b\na: slope\nb: intercept')
+
+
+def linear_fit(model, x, y, sigma=None, p0=None, pF=None, absolute_sigma=False):
+    """
+    fits a LinearModel by a QR decomposition of the (weighted) design matrix, which is accumulated
+    chunk by chunk, so also large (memory-mapped) data is fitted without large temporary arrays
+    p0 : values of the parameters, only the values of the fixed parameters are used
+    pF : fixed parameters, see curve_fit_wrapper()
+    returns popt, pcov (with zero rows and columns for fixed parameters) and Smin.
+    raises a ValueError if the data contains nan or inf values
+    """
+    npars = len(model.names)
+    pF = np.zeros(npars, dtype=bool) if pF is None else np.asarray(pF, dtype=bool)
+    p0 = np.ones(npars) if p0 is None else np.asarray(p0, dtype=float)
+    free = np.flatnonzero(~pF)
+    nfree, npoints = len(free), len(y)
+
+    # R of the QR decomposition of the augmented matrix [A | y], with the contribution of fixed parameters
+    # subtracted from y, holds the normal equations R11 p = r and Smin = R[n, n]**2
+    R = np.zeros((0, nfree + 1))
+    for chunk in chunks(npoints):
+        design = np.asarray(model.basis(x[chunk]), dtype=float)
+        target = np.asarray(y[chunk], dtype=float)
+        if len(free) < npars:
+            target = target - design[:, pF] @ p0[pF]
+        augmented = np.column_stack((design[:, free], target))
+        if sigma is not None:
+            augmented /= np.asarray(sigma[chunk], dtype=float)[:, np.newaxis]
+        R = np.linalg.qr(np.vstack((R, augmented)), mode='r')
+    if not np.all(np.isfinite(R)):
+        raise ValueError('The data contains nan or inf values')
+    R11, r = R[:nfree, :nfree], R[:nfree, nfree]
+    smin = R[nfree, nfree]**2 if len(R) > nfree else 0.
+
+    popt = p0.copy()
+    pcov = np.zeros((npars, npars))
+    try:
+        popt[free] = np.linalg.solve(R11, r)
+        Rinv = np.linalg.inv(R11)
+        cov = Rinv @ Rinv.T
+        if not absolute_sigma:
+            cov *= smin / (npoints - nfree) if npoints > nfree else np.inf
+    except np.linalg.LinAlgError:
+        popt[free] = np.linalg.lstsq(R11, r, rcond=None)[0]
+        cov = np.full((nfree, nfree), np.inf)
+    if not np.all(np.isfinite(cov)):
+        warnings.warn('Covariance of the parameters could not be estimated', category=OptimizeWarning)
+    pcov[np.ix_(free, free)] = cov
+    return popt, pcov, smin
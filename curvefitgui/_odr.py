@@ -0,0 +1,160 @@
+"""
+Orthogonal distance regression: fits with errors in both x and y
+"""
+import numpy as np
+from scipy.optimize import least_squares
+
+from ._tools import jacobian_covariance, relative_steps, complex_step_agrees, COMPLEX_STEP, CENTRAL_STEP
+
+
+class XSlope:
+    """
+    values and derivatives with respect to x of a model f(x, *pars), evaluated for all datapoints at once
+    jac_x : optional function jac_x(x, *pars) that returns the derivative df/dx, otherwise the derivative
+            is computed by the complex step (a single complex evaluation of the model that also gives its
+            value) if the model supports complex x, or else by central differences
+    """
+
+    def __init__(self, func, jac_x=None):
+        self.func = func
+        self.jac_x = jac_x
+        self.method = None if jac_x is None else 'analytic'  # resolved at first use
+
+    def __call__(self, x, pars):
+        """ returns the values f(x) and the derivatives df/dx """
+        if self.method is None:
+            self.method = self._resolve(x, pars)
+        if self.method == 'analytic':
+            return np.asarray(self.func(x, *pars), dtype=float), np.asarray(self.jac_x(x, *pars), dtype=float)
+        if self.method == 'complex':
+            return self._complex_step(x, pars)
+        return np.asarray(self.func(x, *pars), dtype=float), self._central(x, pars)
+
+    def _complex_step(self, x, pars):
+        steps = relative_steps(x, COMPLEX_STEP)
+        values = self.func(x + 1j * steps, *pars)
+        return values.real, values.imag / steps
+
+    def _central(self, x, pars):
+        steps = relative_steps(x, CENTRAL_STEP)
+        upper, lower = x + steps, x - steps
+        return (self.func(upper, *pars) - self.func(lower, *pars)) / (upper - lower)
+
+    def _resolve(self, x, pars):
+        """ returns 'complex' if the complex step derivative agrees with central differences, otherwise 'central' """
+        central = self._central(x, pars)
+        try:
+            with np.errstate(all='ignore'):
+                _, complex_step = self._complex_step(x, pars)
+        except Exception:
+            return 'central'  # the model does not accept complex x
+        return 'complex' if complex_step_agrees(complex_step, central) else 'central'
+
+
+def solve_deltas(slope, x, y, ratio, ye, pars, delta, iterations=50, tol=1e-6):
+    """
+    finds for fixed parameters the x-corrections delta that minimise the orthogonal distance of each datapoint
+    to the curve, (y - f(x + delta))**2 / ye**2 + delta**2 / xe**2, vectorised over all datapoints.
+    The first step is a Gauss-Newton step, next steps use the curvature of the distance estimated from the
+    change of its gradient (secant method). The step is halved for points where the distance does not decrease.
+    slope : XSlope of the model
+    ratio : (xe / ye)**2
+    delta : initial values of the x-corrections
+    tol : the iteration stops when all steps are smaller than tol * (|delta| + xe), the error in the distance
+          is of second order in the error of delta
+    returns the x-corrections, the residuals y - f(x + delta) and the slopes df/dx at x + delta
+    """
+    weight = np.where(ratio > 0, 1 / np.where(ratio > 0, ratio, 1), 0)  # points without error in x keep delta = 0
+    values, slopes = slope(x + delta, pars)
+    residuals = y - values
+    distance = residuals**2 + weight * delta**2
+    gradient = ratio * slopes * residuals - delta  # minus the gradient of the distance times xe**2 / 2
+    steps = gradient / (1 + ratio * slopes**2)
+    size = np.ones(len(x))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(iterations):
+            if not np.any(np.abs(size * steps) > tol * (np.abs(delta) + np.sqrt(ratio) * ye)):
+                break
+            trial = delta + size * steps
+            trial_values, trial_slopes = slope(x + trial, pars)
+            trial_residuals = y - trial_values
+            trial_distance = trial_residuals**2 + weight * trial**2
+            trial_gradient = ratio * trial_slopes * trial_residuals - trial
+            better = trial_distance <= distance
+
+            # the secant step is used where the estimated curvature is positive, otherwise a Gauss-Newton step
+            curvature = (trial_gradient - gradient) / (trial - delta)
+            secant = better & (curvature < 0) & np.isfinite(curvature)
+            newton = trial_gradient / (1 + ratio * trial_slopes**2)
+            steps = np.where(secant, -trial_gradient / curvature, np.where(better, newton, steps))
+            delta = np.where(better, trial, delta)
+            residuals = np.where(better, trial_residuals, residuals)
+            slopes = np.where(better, trial_slopes, slopes)
+            distance = np.where(better, trial_distance, distance)
+            gradient = np.where(better, trial_gradient, gradient)
+            size = np.where(better, 1., size / 2)
+    return delta, residuals, slopes
+
+
+def odr_fit(func, jac, x, y, xe, ye=None, p0=None, absolute_sigma=False, jac_x=None, **kwargs):
+    """
+    fits func(x, *pars) to data with errors in x and y by minimising the sum of the weighted orthogonal
+    distances S = sum((y - f(x + delta))**2 / ye**2 + delta**2 / xe**2) over the parameters and the
+    x-corrections delta, as in orthogonal distance regression (ODRPACK).
+    The x-corrections are solved per datapoint for the current parameters (solve_deltas()), which reduces
+    the fit to a least squares problem in the parameters only with the residuals
+    (f(x + delta) - y) / ye * sqrt(1 + (xe / ye * df/dx)**2), whose sum of squares equals S.
+    func : the model with only the (free) fitparameters as arguments
+    jac : function jac(x, *pars) that returns the jacobian of func with respect to the parameters
+    xe, ye : errors in x and y, ye is None for unit errors in y
+    jac_x : optional derivative jac_x(x, *pars) of func with respect to x, see XSlope
+    kwargs : keyword arguments of least_squares(), the default method is 'lm', or 'trf' with bounds
+    returns popt, pcov and Smin, the covariance is computed from the jacobian at the optimum as in curve_fit()
+    """
+    x, y, xe = (np.asarray(var, dtype=float) for var in (x, y, xe))
+    ye = np.ones(len(y)) if ye is None else np.asarray(ye, dtype=float)
+    if not np.all(np.isfinite(x)) or not np.all(np.isfinite(y)):
+        raise ValueError('The data contains nan or inf values')
+    p0 = np.asarray(p0, dtype=float)
+    kwargs.setdefault('method', 'lm' if kwargs.get('bounds') is None else 'trf')
+    if kwargs.get('bounds') is None:
+        kwargs.pop('bounds', None)
+    slope = XSlope(func, jac_x)
+    ratio = (xe / ye)**2
+    state = {'delta': np.zeros(len(x))}  # x-corrections of the last evaluation, the start of the next
+
+    def solve(pars):
+        key = tuple(pars)
+        if state.get('pars') != key:
+            delta, residuals, slopes = solve_deltas(slope, x, y, ratio, ye, pars, state['delta'])
+            state.update(pars=key, delta=delta, scale=np.sqrt(1 + ratio * slopes**2) / ye, residuals=residuals)
+        return state
+
+    def residuals(pars):
+        solved = solve(pars)
+        return -solved['residuals'] * solved['scale']
+
+    def jacobian(pars):
+        solved = solve(pars)
+        return np.asarray(jac(x + solved['delta'], *pars), dtype=float) / (solved['scale'] * ye**2)[:, np.newaxis]
+
+    result = least_squares(residuals, p0, jac=jacobian, **kwargs)
+    if not result.success:
+        raise RuntimeError('Optimal parameters not found: ' + result.message)
+    solved = solve(result.x)
+    smin = _distance(solved['residuals'], solved['delta'], xe, ye)
+
+    return result.x, jacobian_covariance(result.jac, smin, absolute_sigma), smin
+
+
+def odr_chi_square(func, x, y, xe, ye, pars, jac_x=None):
+    """ returns the sum of the weighted orthogonal distances S of the data to the curve for the parameters pars """
+    x, y, xe = (np.asarray(var, dtype=float) for var in (x, y, xe))
+    ye = np.ones(len(y)) if ye is None else np.asarray(ye, dtype=float)
+    delta, residuals, _ = solve_deltas(XSlope(func, jac_x), x, y, (xe / ye)**2, ye, pars, np.zeros(len(x)))
+    return _distance(residuals, delta, xe, ye)
+
+
+def _distance(residuals, delta, xe, ye):
+    """ returns the sum of the weighted orthogonal distances, points without error in x have delta = 0 """
+    return float(np.dot(residuals / ye, residuals / ye) + np.sum((delta[xe > 0] / xe[xe > 0])**2))
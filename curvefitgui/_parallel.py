@@ -0,0 +1,118 @@
+"""
+Process-pool execution of many independent fits
+"""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+
+_shared = None  # (call, data shared by all chunks of the call), set once per call in each worker process
+
+
+def get_n_jobs(n_jobs):
+    """
+    returns the number of worker processes for n_jobs
+    None or 1 means no parallel execution, -1 means all cpu cores, -2 all cores but one, etc.
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+    return max(1, int(n_jobs))
+
+
+def split_chunks(n, n_jobs, chunksize=None):
+    """
+    returns a list of slices dividing n tasks into chunks
+    by default each worker receives about four chunks to balance the load
+    """
+    if chunksize is None:
+        chunksize = -(-n // (4 * n_jobs))  # ceil division
+    chunksize = max(1, int(chunksize))
+    return [slice(start, min(start + chunksize, n)) for start in range(0, n, chunksize)]
+
+
+def is_picklable(obj):
+    """ returns True if obj can be send to a worker process """
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+class WorkerPool:
+    """
+    worker processes reused by all calls of run_chunks() of a bootstrap, multi-start fit or landscape
+    the processes are started on the first call and shut down on exit, use the pool as a context manager:
+        with WorkerPool(n_jobs) as pool:
+            run_chunks(worker, shared, chunks, pool=pool)
+    n_jobs : number of worker processes, see get_n_jobs()
+    """
+
+    def __init__(self, n_jobs=1):
+        self.n_jobs = get_n_jobs(n_jobs)
+        self._executor = None
+        self._calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def map(self, worker, shared, chunks):
+        """
+        calls worker(shared, chunk) for each chunk in the worker processes. shared is pickled once into a shared
+        memory block, of which only the name is sent with the chunks, and is read once by each worker process
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.n_jobs)
+        self._calls += 1
+        data = pickle.dumps(shared, protocol=pickle.HIGHEST_PROTOCOL)
+        block = SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            block.buf[:len(data)] = data
+            tasks = [(self._calls, block.name, len(data), worker, chunk) for chunk in chunks]
+            return list(self._executor.map(_call_worker, tasks))
+        finally:
+            block.close()
+            block.unlink()
+
+
+def _call_worker(args):
+    global _shared
+    call, name, size, worker, chunk = args
+    if _shared is None or _shared[0] != call:
+        # first chunk of this call in this process
+        block = SharedMemory(name=name)
+        try:
+            with block.buf[:size] as data:
+                _shared = (call, pickle.loads(data))
+        finally:
+            block.close()
+    return worker(_shared[1], chunk)
+
+
+def run_chunks(worker, shared, chunks, n_jobs=1, pool=None):
+    """
+    calls worker(shared, chunk) for each chunk and returns the results in the order of chunks
+    worker : function defined at module level
+    shared : data needed by all chunks, sent only once to each worker process
+    chunks : list with the data of each chunk
+    n_jobs : number of worker processes, see get_n_jobs(), ignored if a pool is given
+    pool : WorkerPool of which the processes are used, by default processes are started for this call only
+    """
+    n_jobs = pool.n_jobs if pool is not None else get_n_jobs(n_jobs)
+    if min(n_jobs, len(chunks)) <= 1:
+        return [worker(shared, chunk) for chunk in chunks]
+    if pool is not None:
+        return pool.map(worker, shared, chunks)
+    with WorkerPool(min(n_jobs, len(chunks))) as pool:
+        return pool.map(worker, shared, chunks)
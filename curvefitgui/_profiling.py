@@ -0,0 +1,65 @@
+"""
+Opt-in instrumentation of the fit pipeline: timings of the stages of a fit and cProfile captures
+"""
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Timings:
+    """
+    collects the durations (in seconds) of the stages of a fit and counters such as the number of
+    model calls. record holds the stages in the order in which they were first timed.
+    """
+
+    def __init__(self):
+        self.record = {}
+
+    @contextmanager
+    def stage(self, name):
+        """ times the enclosed block and adds its duration to the stage name """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, value):
+        self.record[name] = self.record.get(name, 0) + value
+
+
+def stage(timings, name):
+    """ returns timings.stage(name), or a context that does nothing if timings is None """
+    return nullcontext() if timings is None else timings.stage(name)
+
+
+class TimedModel:
+    """ wraps a model function func(x, *pars) and counts its calls and their cumulative duration """
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self.time = 0.
+
+    def __call__(self, x, *pars):
+        start = time.perf_counter()
+        try:
+            return self.func(x, *pars)
+        finally:
+            self.calls += 1
+            self.time += time.perf_counter() - start
+
+
+@contextmanager
+def profiled(filename):
+    """ runs the enclosed block with cProfile and dumps the statistics to filename, does nothing if filename is None """
+    if filename is None:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
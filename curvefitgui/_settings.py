@@ -1,8 +1,35 @@
 from importlib import resources as _resources
 import configparser
-import matplotlib.font_manager as fm
-import matplotlib as mpl
+import time
 
+# matplotlib is imported only when a font is resolved, so that fitting without the gui 
+# does not import it
+
+
+_font_index = None  # names of the available fonts, in the order of the matplotlib font list
+_font_set = None  # the same names as a set for fast lookups
+
+# timings (in seconds) of building the font index and resolving the configured fonts
+font_timings = {'index': None, 'resolve': None}
+
+
+def get_font_index():
+    """
+    Get the names of all fonts available to Matplotlib. 
+    
+    The index is built only once per session.
+
+    Returns:
+        list: The font names in the order of the Matplotlib font list.
+    """
+    global _font_index, _font_set
+    if _font_index is None:
+        start = time.perf_counter()
+        import matplotlib.font_manager as fm
+        _font_index = list(dict.fromkeys(f.name for f in fm.fontManager.ttflist))
+        _font_set = set(_font_index)
+        font_timings['index'] = time.perf_counter() - start
+    return _font_index
 
 
 def default_font():
@@ -12,6 +39,8 @@ def default_font():
     Returns:
         str: The resolved name of the default font family.
     """
+    import matplotlib as mpl
+
     family = mpl.rcParams['font.family']
 
     # Normalize to list
@@ -41,7 +70,7 @@ def default_font():
                 return name
     
     # Ultimate fallback - find any available font
-    available_fonts = [f.name for f in fm.fontManager.ttflist]
+    available_fonts = get_font_index()
     if available_fonts:
         return available_fonts[0]
     
@@ -58,8 +87,33 @@ def is_font_available(font_name):
     Returns:
         bool: True if the font is available, False otherwise.
     """
-    available_fonts = [f.name for f in fm.fontManager.ttflist]
-    return font_name in available_fonts
+    get_font_index()
+    return font_name in _font_set
+
+
+def resolve_fonts(font_names):
+    """
+    Resolve several font names in one pass; unavailable fonts are replaced by the default font,
+    which is determined at most once.
+
+    Args:
+        font_names (iterable): The desired font names.
+
+    Returns:
+        dict: Maps each desired font name on the font name to use.
+    """
+    start = time.perf_counter()
+    resolved = {}
+    default = None
+    for font_name in font_names:
+        if is_font_available(font_name):
+            resolved[font_name] = font_name
+        else:
+            if default is None:
+                default = default_font()
+            resolved[font_name] = default
+    font_timings['resolve'] = time.perf_counter() - start
+    return resolved
 
 
 def get_font(font_name):
@@ -72,43 +126,83 @@ def get_font(font_name):
     Returns:
         str: The font name if available, otherwise the default font.
     """
+    return resolve_fonts([font_name])[font_name]
 
-    if is_font_available(font_name):
-        return font_name
-    
-    else:
-        return default_font()
+
+class _Settings(dict):
+    """
+    dictionary with the settings, the fonts are resolved when a font setting is used for the first time
+    """
+
+    def __init__(self, fonts):
+        super().__init__()
+        self._fonts = fonts  # maps the font settings on the font names in the config file
+
+    def __missing__(self, key):
+        if key not in self._fonts:
+            raise KeyError(key)
+        resolved = resolve_fonts(set(self._fonts.values()))
+        for fontkey, font_name in self._fonts.items():
+            self[fontkey] = resolved[font_name]
+        return self[key]
 
 
 _config = configparser.ConfigParser()
 with _resources.path("curvefitgui", "config.txt") as _path:
     _config.read(str(_path))
 
-settings = {}
+settings = _Settings({
+    'FONT': _config['general']['font'],
+    'REPORT_FONT': _config['reportview']['font'],
+    'TICK_FONT': _config['ticklabels']['font'],
+    'TEXT_FONT': _config['text']['font'],
+})
 
 # general
 settings['MODEL_NUMPOINTS'] = int(_config['general']['numpoints'])
 settings['SIGNIFICANT_DIGITS'] = int(_config['general']['significant_digits'])
 settings['XERRORWARNING'] = _config.getboolean('general','show_x_error_warning')
 settings['SORT_RESIDUALS'] = _config.getboolean('general','sort_residuals')
-settings['FONT'] = get_font(_config['general']['font'])
 
 
+# cache
+settings['CACHE_SIZE'] = int(_config['cache']['size'])
+settings['CACHE_PATH'] = _config['cache']['path'] or None
+
 # fitparameters
 settings['CM_SIG_DIGITS'] = int(_config['fitparameter']['significant_digits'])
 settings['CM_SIG_DIGITS_NO_ERROR'] = int(_config['fitparameter']['significant_digits_fixed'])
 
+# bootstrap
+settings['BOOTSTRAP_SAMPLES'] = int(_config['bootstrap']['samples'])
+settings['BOOTSTRAP_NJOBS'] = int(_config['bootstrap']['n_jobs'])
+
+# profiling
+settings['PROFILE_TIMINGS'] = _config.getboolean('profiling', 'timings')
+settings['PROFILE_FILE'] = _config['profiling']['profile_file'] or None
+
+# multistart
+settings['MULTISTART_STARTS'] = int(_config['multistart']['starts'])
+settings['MULTISTART_SAMPLER'] = _config['multistart']['sampler']
+settings['MULTISTART_AGREE'] = int(_config['multistart']['agree'])
+settings['MULTISTART_NJOBS'] = int(_config['multistart']['n_jobs'])
+
+# landscape
+settings['LANDSCAPE_NUMPOINTS'] = int(_config['landscape']['numpoints'])
+settings['LANDSCAPE_NJOBS'] = int(_config['landscape']['n_jobs'])
+
+# preview
+settings['PREVIEW_DELAY'] = int(_config['preview']['delay'])
+settings['SLIDER_RANGE'] = float(_config['preview']['slider_range'])
+
 # reportview
-settings['REPORT_FONT'] = get_font(_config['reportview']['font'])
 settings['REPORT_SIZE'] = int(_config['reportview']['size'])
 
 # ticklabels
 settings['TICK_COLOR'] = _config['ticklabels']['color']
-settings['TICK_FONT'] = get_font(_config['ticklabels']['font'])
 settings['TICK_SIZE'] = int(_config['ticklabels']['size'])
 
 # text
-settings['TEXT_FONT'] = get_font(_config['text']['font'])
 settings['TEXT_SIZE'] = int(_config['text']['size'])
 
 # errorbars
@@ -118,4 +212,11 @@ settings['BAR_Y_THICKNESS'] = int(_config['errorbars']['y_bar_thickness'])
 settings['BAR_X_THICKNESS'] = int(_config['errorbars']['x_bar_thickness'])
 
 # figure
-settings['FIG_DPI'] = int(_config['figure']['dpi'])
\ No newline at end of file
+settings['FIG_DPI'] = int(_config['figure']['dpi'])
+settings['PLOT_MAX_POINTS'] = int(_config['figure']['max_points'])
+
+# bands
+settings['BANDS_SHOW'] = _config['bands']['show']
+settings['BANDS_LEVEL'] = float(_config['bands']['level'])
+settings['BANDS_COLOR'] = _config['bands']['color']
+settings['BANDS_ALPHA'] = float(_config['bands']['alpha'])
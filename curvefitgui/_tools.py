@@ -2,38 +2,116 @@
 from ._settings import settings
 import numpy as np
 import inspect
+import warnings
+from functools import lru_cache
+from types import SimpleNamespace
 from scipy.optimize import curve_fit, OptimizeWarning
-from scipy import stats
+from scipy.special import stdtrit  # inverse of the student t cdf, avoids importing the slow scipy.stats
 from dataclasses import dataclass, field
 from typing import Any, List
+from ._parallel import get_n_jobs, split_chunks, is_picklable, run_chunks, WorkerPool
+from ._cache import get_cache, fit_key
+from ._ingest import as_data_array, empty_like_data, chunks, CHUNKSIZE
+from ._linear import LinearModel, linear_fit
+from ._profiling import Timings, TimedModel, stage, profiled
+
+def _parameter_field(attribute):
+    """ property of a FitParameter that reads and writes its entry of the parameter array attribute """
+    def getter(self):
+        return getattr(self._store, attribute)[self._index].item()
+
+    def setter(self, value):
+        getattr(self._store, attribute)[self._index] = value
+    return property(getter, setter)
+
 
-@dataclass
 class FitParameter:
     """
-    stores a fitparameter
+    stores a fitparameter. Its values are kept in the parameter arrays of the FitModel that holds it, 
+    a FitParameter is a named view on one entry of these arrays.
     """
-    name: str
-    value: float = 1.
-    sigma: float = 0.
-    fixed: bool = False
+    ARRAYS = ('values', 'sigmas', 'fixed', 'lower', 'upper')
+
+    def __init__(self, name, value=1., sigma=0., fixed=False, lower=-np.inf, upper=np.inf):
+        self.name = name
+        self._store = SimpleNamespace(values=np.array([value], dtype=float), sigmas=np.array([sigma], dtype=float), 
+                                      fixed=np.array([fixed], dtype=bool), lower=np.array([lower], dtype=float), 
+                                      upper=np.array([upper], dtype=float))
+        self._index = 0
+
+    value = _parameter_field('values')
+    sigma = _parameter_field('sigmas')
+    fixed = _parameter_field('fixed')
+    lower = _parameter_field('lower')  # bounds of the value during the fit
+    upper = _parameter_field('upper')
+
+    def _bind(self, store, index):
+        """ moves the values of the parameter to entry index of the parameter arrays of store """
+        for attribute in self.ARRAYS:
+            getattr(store, attribute)[index] = getattr(self._store, attribute)[self._index]
+        self._store, self._index = store, index
+
+    def __repr__(self):
+        return (f'FitParameter(name={self.name!r}, value={self.value!r}, sigma={self.sigma!r}, fixed={self.fixed!r}, '
+                f'lower={self.lower!r}, upper={self.upper!r})')
+
 
 @dataclass
 class FitModel:
     """
     stores the model
+    the values, standard errors, fixed flags and bounds of the fitparameters are kept in the contiguous
+    arrays values, sigmas, fixed, lower and upper, the FitParameters in fitpars are named views on them.
     """
     func: Any
     jac: Any
     weight: str
     fitpars: List[FitParameter]
     description: str = ''
-    
+    method: str = 'lm'  # solver: lm, trf or dogbox of curve_fit() or odr (orthogonal distance regression)
+    jac_x: Any = None  # optional derivative of func with respect to x, used by the odr solver
+    broadcasts: Any = None  # whether func broadcasts over arrays of parameter values, None if not yet known
+    values: np.ndarray = field(init=False, repr=False)
+    sigmas: np.ndarray = field(init=False, repr=False)
+    fixed: np.ndarray = field(init=False, repr=False)
+    lower: np.ndarray = field(init=False, repr=False)
+    upper: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        npars = len(self.fitpars)
+        self.values, self.sigmas, self.lower, self.upper = (np.empty(npars) for _ in range(4))
+        self.fixed = np.zeros(npars, dtype=bool)
+        for index, par in enumerate(self.fitpars):
+            par._bind(self, index)
+        if self.broadcasts is None:
+            self.broadcasts = getattr(self.func, 'broadcasts', None)  # declared by the model, see LinearModel
+
+    def evaluate(self, x, pars=None):
+        """ evaluates the model at x with the values of the fitparameters, or with the values in pars """
+        if pars is None:
+            pars = self.values
+        return self.func(x, *pars)
 
-    def evaluate(self, x):
-        return self.func(x, *(par.value for par in self.fitpars))
+    BROADCAST_PROBE = 16  # number of datapoints used to probe whether func broadcasts
+
+    def probe_broadcasts(self, x):
+        """ determines (once) whether func broadcasts over arrays of parameter values for the datapoints x and returns it """
+        if self.broadcasts is None:
+            stacked = np.tile(self.values, (2, 1))
+            self.broadcasts = _broadcast_call(self.func, x[:self.BROADCAST_PROBE], stacked) is not None
+        return self.broadcasts
+
+    def evaluate_batch(self, x, pars):
+        """
+        evaluates the model at x for each row of parameter values in pars (nsets, n) and returns an array (nsets, len(x)).
+        All sets are evaluated in one call of func if it broadcasts over arrays of parameter values (see 
+        probe_broadcasts()), otherwise set by set.
+        """
+        stacked = np.atleast_2d(np.asarray(pars, dtype=float))
+        return evaluate_stacked(self.func, x, stacked, self.probe_broadcasts(x))
 
     def get_numfitpars(self):
-        return sum([not par.fixed for par in self.fitpars])  
+        return int(np.count_nonzero(~self.fixed))
 
     
 @dataclass
@@ -42,61 +120,127 @@ class FitData:
     y: np.array  # y-data
     xe: np.array = None # error-data on x-values
     ye: np.array = None # error-data on y-values
-    mask: List[bool] = field(init=False)
+    mask: np.ndarray = field(init=False)  # boolean mask of the datapoints used in the fit
+    ranges: List[tuple] = field(init=False)  # the (xmin, xmax) ranges of x-values used in the fit
+    exclude: np.ndarray = field(init=False)  # boolean mask of datapoints excluded from the fit
 
     def __post_init__(self):
+        self.exclude = None
         self.set_mask(-np.inf, np.inf)
 
+    def __setattr__(self, name, value):
+        if name == 'mask':
+            value = np.asarray(value, dtype=bool)
+            if value.shape != np.shape(self.x):
+                raise Exception('mask and xdata should be of equal length')
+        super().__setattr__(name, value)
+        if name in ('x', 'y', 'xe', 'ye', 'mask'):
+            self.__dict__['_masked'] = None  # clear the cached masked data
+        if name == 'mask':
+            self._index_mask()
+        if name == 'x' and 'ranges' in self.__dict__:
+            self._update_mask()
+
     def get(self):
-        result = (var[self.mask] if var is not None else None for var in [self.x, self.y, self.xe, self.ye] )
-        return result
+        """ 
+        returns the x, y, xe and ye data within the mask (cached until the data or mask changes)
+        if the datapoints in the mask are contiguous (e.g. one range of sorted data), views of the
+        data are returned, so the data (also memory-mapped data) is not copied
+        """
+        if self._masked is None:
+            select = self.mask if self._slice is None else self._slice
+            self._masked = tuple(var[select] if var is not None else None for var in [self.x, self.y, self.xe, self.ye])
+        return self._masked
 
     def set_mask(self, xmin, xmax):
-        self.mask = [xmin <= x <= xmax for x in self.x]
+        """ use only the datapoints with xmin <= x <= xmax in the fit """
+        self.set_ranges([(xmin, xmax)])
+
+    def set_ranges(self, ranges):
+        """ use only the datapoints within one of the (xmin, xmax) ranges in the fit """
+        self.ranges = [tuple(arange) for arange in ranges]
+        self._update_mask()
+
+    def set_exclusion(self, exclude):
+        """ 
+        excludes datapoints from the fit irrespective of the ranges 
+        exclude: boolean array of the same length as x that is True for excluded points, or None
+        """
+        if exclude is not None:
+            exclude = np.asarray(exclude, dtype=bool)
+            if exclude.shape != np.shape(self.x):
+                raise Exception('exclusion mask and xdata should be of equal length')
+        self.exclude = exclude
+        self._update_mask()
+
+    def _update_mask(self):
+        mask = np.zeros(np.shape(self.x), dtype=bool)
+        for chunk in chunks(len(mask)):  # limits the temporary arrays for large (memory-mapped) data
+            x = self.x[chunk]
+            for xmin, xmax in self.ranges:
+                mask[chunk] |= (x >= xmin) & (x <= xmax)
+        if self.exclude is not None:
+            mask &= ~self.exclude
+        self.mask = mask  # also counts the points in the mask, see _index_mask()
+
+    def _index_mask(self):
+        """ counts the points in the mask, they can be selected with a slice if they are contiguous """
+        mask = self.mask
+        self._numfitpoints = count = int(np.count_nonzero(mask))
+        first = int(np.argmax(mask)) if count else 0
+        self._slice = slice(first, first + count) if count and mask[first:first + count].all() else None
 
     def get_numfitpoints(self):
-        return len(self.x[self.mask])
+        return self._numfitpoints
 
 
 class Fitter:
     """ class to handle the fit """
 
     WEIGHTOPTIONS = ('none', 'relative', 'absolute')
+    SOLVEROPTIONS = ('lm', 'trf', 'dogbox', 'odr')
 
-    def __init__(self, func, xdata, ydata, xerr, yerr, p0, absolute_sigma, jac, **kwargs):
+    def __init__(self, func, xdata, ydata, xerr, yerr, p0, absolute_sigma, jac, cache=None, 
+                 bounds=None, method=None, jac_x=None, instrument=None, profile=None, **kwargs):
         
-        self.kwargs = kwargs
+        self.kwargs = kwargs  # other keyword arguments of curve_fit(), e.g. x_scale, ftol, max_nfev, jac_sparsity
+        self.cache = get_cache(cache)  # optional FitCache to reuse results of identical fits
         self.data = self._init_data(xdata, ydata, xerr, yerr)
-        self.model = self._init_model(func, p0, absolute_sigma, jac)
+        self.model = self._init_model(func, p0, absolute_sigma, jac, bounds, method)
+        self.model.jac_x = jac_x
         self.fit_is_valid = False  # becomes True a a valid fit is computed
         self.mean_squared_error = None
+        self.popt = None  # fitted parameter values of the last fit, the model values may be edited afterwards
+        self.pcov = None  # covariance of the last fit
+        self._fit_residuals = None  # (popt, residuals of all datapoints) of the last fit, if known from the solver
+        self._bands = None  # (key, bands) of the last computed confidence and prediction bands
+        self._landscape = None  # Landscape of the last fit, see get_landscape()
         self.fitreport = {}
+        self.instrument = settings['PROFILE_TIMINGS'] if instrument is None else instrument  # time the stages of a fit
+        self.profile = settings['PROFILE_FILE'] if profile is None else profile  # file for a cProfile capture of the next fit
+        self.timings = None  # timings of the stages of the last fit if instrumented, see fit()
 
     def _init_data(self, x, y, xe, ye):
 
-        # validate data
-        for var in [x, y]:
-            if type(var) is not np.ndarray:
-                raise Exception('data should have type numpy array')
+        # validate data, memory-mapped arrays, .npy files and iterators of chunks are accepted as well
+        x, y = as_data_array(x), as_data_array(y)
         if len(x) != len(y):
             raise Exception('xdata and ydata should be of equal length')
 
         # get error data if provided
         if ye is not None:
-            if type(ye) is not np.ndarray:
-                raise Exception('data should have type numpy array')
+            ye = as_data_array(ye)
             if len(ye) != len(y):
                 raise Exception('yerr and ydata should be of equal length')
         
         if xe is not None:
-            if type(xe) is not np.ndarray:
-                raise Exception('data should have type numpy array')
+            xe = as_data_array(xe)
             if len(xe) != len(x):
                 raise Exception('xerr and xdata should be of equal length')
 
         return FitData(x, y, xe, ye)
 
-    def _init_model(self, func, p0, absolute_sigma, jac):
+    def _init_model(self, func, p0, absolute_sigma, jac, bounds, method):
         # validate function
         if not callable(func): 
             raise Exception('Not a valid fit function')
@@ -111,6 +255,20 @@ class Fitter:
         
         # create the fitpars    
         fitpars = [FitParameter(arg, value) for arg, value in zip(args[1:], p0)] 
+        afitmodel = FitModel(func, jac, None, fitpars)
+        if bounds is not None:
+            lower, upper = _bounds_pair(bounds)
+            afitmodel.lower[:], afitmodel.upper[:] = lower, upper
+
+        if method == 'odr' and self.data.xe is None:
+            raise Exception('The odr solver requires the errors in x (xerr)')
+
+        # the default solver is lm, which does not support bounds
+        if method is None:
+            bounded = np.any(np.isfinite(afitmodel.lower)) or np.any(np.isfinite(afitmodel.upper))
+            method = self.SOLVEROPTIONS[1] if bounded else self.SOLVEROPTIONS[0]
+        if method not in self.get_solveroptions():
+            raise Exception(f"method should be one of {', '.join(self.get_solveroptions())}")
         
         # make additional modifications
         if self.data.ye is not None:
@@ -121,22 +279,126 @@ class Fitter:
         else:
             weight = self.WEIGHTOPTIONS[0]                       
         
-        # create and return the FitModel class
+        # complete and return the FitModel class
         if func.__doc__ is None:
             description = 'no info on model'
         else:
             description = strip_leading_spaces(func.__doc__) 
             
-        afitmodel = FitModel(func, jac, weight, fitpars, description)      
+        afitmodel.weight, afitmodel.description, afitmodel.method = weight, description, method
         return afitmodel
 
-    def fit(self):
+    def fit(self, callback=None):
         """
         performs the fit
+        callback : optional function callback(nfev, pars) that is called before each evaluation of the 
+                   model during the fit. The fit is cancelled (FitCancelled is raised) if it returns True.
+        if instrument is True, the durations of the stages of the fit are stored in timings and added to the 
+        fitreport. If profile is the name of a file, the fit is profiled with cProfile and the statistics 
+        are written to the file, after which profile is reset to None.
         """
+        timings = Timings() if self.instrument else None
+        try:
+            with profiled(self.profile):
+                popt, pcov = self._fit(callback, timings)
+        finally:
+            self.profile = None  # a profile is captured for a single fit
+        if timings is not None:
+            self.timings = None
+            self.add_timings(timings.record)
+        return popt, pcov
+
+    def _fit(self, callback, timings):
+        """ performs the fit, the stages are timed if timings is a Timings instance """
+        with stage(timings, 'inputs'):
+            p0, pF, x, y, ye, absolute_sigma = self._fit_inputs()
+            p0 = list(p0)
+            options = self._solver_options()
+            odr = options['method'] == 'odr'
+
+            cache, cached = self.cache, None
+            if cache is not None:
+                data = [self.data.x, self.data.y, self.data.ye, self.data.mask] + ([self.data.xe] if odr else [])
+                key = fit_key(self.model.func, self.model.jac, data, 
+                              [p0, pF, self.model.weight], options)
+                if key is None:
+                    cache = None  # the model can not be identified reliably, the fit is not cached
+                else:
+                    cached = cache.get(key)
+
+        # the calls of the model are counted and timed if the fit is instrumented
+        func = self.model.func if timings is None else TimedModel(self.model.func)
+        self._fit_residuals = None
+        infodict = {}
+        if cached is not None:
+            popt, pcov = cached[0].copy(), cached[1].copy()
+            with stage(timings, 'residuals'):
+                if odr:
+                    from ._odr import odr_chi_square  # _odr imports from this module
+                    smin = odr_chi_square(func, x, y, self.data.get()[2], ye, popt, self.model.jac_x)
+                else:
+                    smin = self._chi_square(popt)
+        elif odr:
+            # orthogonal distance regression with the errors in x and y
+            with stage(timings, 'solver'):
+                popt, pcov, smin = odr_wrapper(func, x, y, self.data.get()[2], ye, p0=p0, pF=pF,
+                                               absolute_sigma=absolute_sigma, jac=self.model.jac, 
+                                               jac_x=self.model.jac_x, callback=callback, **options)
+            if cache is not None:
+                cache.put(key, popt, pcov)
+        elif is_linear(self.model.func, options):
+            # direct solution for models that are linear in their parameters
+            with stage(timings, 'solver'):
+                popt, pcov, smin = linear_fit(self.model.func, x, y, ye, p0, pF, absolute_sigma)
+            if cache is not None:
+                cache.put(key, popt, pcov)
+        else:
+            popt, pcov, infodict, _, _ = curve_fit_wrapper(
+                                            func, x, y, sigma=ye, p0=p0, pF=pF,
+                                            absolute_sigma=absolute_sigma, jac=self.model.jac,
+                                            callback=callback, full_output=True, timings=timings, **options
+                                          )
+            if cache is not None:
+                cache.put(key, popt, pcov)
+            
+            # Smin and the residuals follow from the (weighted) residuals of the final solver evaluation
+            with stage(timings, 'residuals'):
+                fvec = infodict['fvec']
+                smin = np.dot(fvec, fvec)
+                if self.data.get_numfitpoints() == len(self.data.x):
+                    self._fit_residuals = (tuple(popt), -fvec if ye is None else -fvec * ye)
+        
+        with stage(timings, 'report'):
+            self._set_result(popt, pcov, smin)
+        if timings is not None:
+            timings.add('nfev', int(infodict.get('nfev', 0)))
+            timings.add('model calls', func.calls)
+            timings.add('model time', func.time)
+        return popt, pcov
+
+    def add_timings(self, stages):
+        """ adds the timed stages (e.g. of the gui) to the timings of the last fit and to the fitreport """
+        self.timings = dict(self.timings or {}, **stages)
+        self.fitreport['TIMINGS'] = {name: value if isinstance(value, int) else np.float64(value) 
+                                     for name, value in self.timings.items()}
+
+    def _chi_square(self, pars):
+        """ returns the weighted sum of squared residuals of the fitted data, computed chunk by chunk """
+        x, y, xe, ye = self.data.get()
+        weighted = self.model.weight != self.WEIGHTOPTIONS[0]
+        smin = 0.
+        for chunk in chunks(len(y)):
+            residuals = y[chunk] - self.model.func(x[chunk], *pars)
+            if weighted:
+                residuals /= ye[chunk]
+            smin += np.dot(residuals, residuals)
+        return smin
+
+    def _fit_inputs(self):
+        """ checks the model and returns the initial values, fixed flags, masked data and weight (ye is None if unweighted) for a fit """
         # prepare model and data
-        p0 = [fitpar.value for fitpar in self.model.fitpars]
-        pF = [fitpar.fixed for fitpar in self.model.fitpars]
+        p0 = self.model.values.copy()
+        pF = self.model.fixed.copy()
         x, y, xe, ye = self.data.get()
 
         # check number of free fitparameters
@@ -149,45 +411,266 @@ class Fitter:
 
         absolute_sigma = self.model.weight == self.WEIGHTOPTIONS[2]
         if self.model.weight == self.WEIGHTOPTIONS[0]:
-            ye = np.ones(len(y))  # error of 1 is equal to no weights
+            ye = None  # no weights
+        return p0, pF, x, y, ye, absolute_sigma
 
-        popt, pcov = curve_fit_wrapper(
-                                        self.model.func, x, y, sigma=ye, p0=p0, pF=pF,
-                                        absolute_sigma=absolute_sigma, jac=self.model.jac
-                                      )
-        
-        # process results
+    def _solver_options(self):
+        """ returns the keyword arguments of curve_fit(): the method, the bounds if any and the other kwargs """
+        options = dict(self.kwargs, method=self.model.method)
+        lower, upper = self.model.lower.copy(), self.model.upper.copy()
+        if np.any(np.isfinite(lower)) or np.any(np.isfinite(upper)):
+            options['bounds'] = (lower, upper)
+        return options
+
+    def _set_result(self, popt, pcov, smin):
+        """ stores the result of a fit in the fitparameters and creates the report """
         self.fit_is_valid = True
-        stderrors = np.sqrt(np.diag(pcov))
-        for fitpar, value, stderr in zip(self.model.fitpars, popt, stderrors):
-                    fitpar.value = value
-                    fitpar.sigma = stderr
-        
-        self.mean_squared_error = sum(((y - self.model.evaluate(x)) / ye)**2)
+        self.popt = np.array(popt, dtype=float)
+        self.pcov = pcov
+        self._bands = None
+        self._landscape = None
+        self.model.values[:] = popt
+        self.model.sigmas[:] = np.sqrt(np.diag(pcov))
         
+        self.mean_squared_error = smin
         self._create_report()
-        return popt, pcov
 
-    def get_curve(self, xmin=None, xmax=None, numpoints=settings['MODEL_NUMPOINTS']):
+    def get_curve(self, xmin=None, xmax=None, numpoints=settings['MODEL_NUMPOINTS'], pars=None):
+        """ returns the model curve, for the parameter values in pars if specified """
         if xmin is None: xmin = self.data.x.min()
         if xmax is None: xmax = self.data.x.max()
         xcurve = np.linspace(xmin, xmax, numpoints)
-        ycurve = self.model.evaluate(xcurve)
+        ycurve = self.model.evaluate(xcurve, pars)
         return (xcurve, ycurve)
 
     def get_fitcurve(self, xmin=None, xmax=None, numpoints=settings['MODEL_NUMPOINTS']):
         if not self.fit_is_valid:
             return None
-        return self.get_curve(xmin, xmax, numpoints)
+        return self.get_curve(xmin, xmax, numpoints, self.popt)
+        
+    def get_bands(self, xmin=None, xmax=None, numpoints=settings['MODEL_NUMPOINTS'], level=0.95):
+        """
+        returns the confidence and prediction bands of the fitted curve as (xcurve, ycurve, confidence, prediction),
+        where confidence and prediction are the half widths of the bands at the confidence level.
+        the bands follow from pcov and the jacobian of the model at all points of the curve. The noise of a new 
+        measurement (prediction band) is estimated from the residuals and, for weighted fits, the mean y-error.
+        returns None if no valid fit is performed or the covariance could not be estimated.
+        the bands are cached until the next fit.
+        """
+        if not self.fit_is_valid or not np.all(np.isfinite(self.pcov)):
+            return None
+        if xmin is None: xmin = self.data.x.min()
+        if xmax is None: xmax = self.data.x.max()
+        pars = self.popt
+        key = (xmin, xmax, numpoints, level)
+        if self._bands is not None and self._bands[0] == key:
+            return self._bands[1]
+        
+        xcurve = np.linspace(xmin, xmax, numpoints)
+        ycurve = self.model.evaluate(xcurve, pars)
+        free = np.flatnonzero(~self.model.fixed)
+        jacobian = model_jacobian(self.model.func, xcurve, pars, free, self.model.jac)
+        variance = np.einsum('ij,jk,ik->i', jacobian, self.pcov[np.ix_(free, free)], jacobian)
+
+        # variance of a new measurement
+        ye = self.data.get()[3]
+        noise = self.mean_squared_error / self._degrees_of_freedom()
+        if self.model.weight == self.WEIGHTOPTIONS[1]:
+            noise *= np.mean(ye**2)
+        elif self.model.weight == self.WEIGHTOPTIONS[2]:
+            noise = np.mean(ye**2)
+
+        t = stdtrit(self._degrees_of_freedom(), 0.5 + level / 2)
+        bands = (xcurve, ycurve, t * np.sqrt(variance), t * np.sqrt(variance + noise))
+        self._bands = (key, bands)
+        return bands
         
-    def get_residuals(self, check=True):
+    def get_landscape(self):
+        """
+        returns the Landscape of Smin around the result of the last fit, which computes profiles and maps of Smin
+        for the fitparameters. The Landscape caches the computed grid points until the next fit.
+        """
+        if not self.fit_is_valid:
+            raise Exception('A valid fit is required to explore the landscape of Smin')
+        if self.model.method == 'odr':
+            raise Exception('The landscape of Smin is not available for the odr solver')
+        if self._landscape is None:
+            from ._landscape import Landscape  # _landscape imports from this module
+            _, _, x, y, ye, absolute_sigma = self._fit_inputs()
+            self._landscape = Landscape(self.model, x, y, ye, self.popt, self.pcov, absolute_sigma, 
+                                        self._solver_options())
+        return self._landscape
+
+    def get_residuals(self, check=True, pars=None):
         """
         return the residuals as y - f(x)
         if check is True(default) only returns values if a valid fit is performed.
+        if pars is specified, the model is evaluated with these parameter values, otherwise with the fitted
+        values (check is True) or the current parameter values (check is False)
         """
         if not self.fit_is_valid and check:
             return None
-        return self.data.y - self.model.evaluate(self.data.x)    
+        if pars is None:
+            pars = self.popt if check else self.model.values.copy()
+            if self._fit_residuals is not None and self._fit_residuals[0] == tuple(pars):
+                return self._fit_residuals[1]  # known from the fit
+        residuals = empty_like_data(self.data.y)
+        for chunk in chunks(len(residuals)):
+            residuals[chunk] = self.data.y[chunk] - self.model.func(self.data.x[chunk], *pars)
+        return residuals
+
+    BOOTSTRAPMETHODS = ('residual', 'pairs', 'montecarlo')
+    BOOTSTRAP_BLOCKSIZE = 10**7  # maximum number of resampled datapoints kept in memory at once
+
+    def bootstrap(self, nsamples=1000, method='residual', level=0.95, n_jobs=1, seed=None, callback=None):
+        """
+        estimates the uncertainty of the fitparameters by refitting resampled datasets
+        method : 'residual' (fitted curve plus resampled residuals), 'pairs' (resampled datapoints) 
+                 or 'montecarlo' (fitted curve plus normally distributed noise with the size of the errors)
+        level : confidence level of the percentile intervals
+        n_jobs : number of worker processes for the refits, see batch_fit()
+        seed : seed of the random generator
+        callback : optional function callback(ndone, None) called after each block of refits, the
+                   bootstrap is cancelled (FitCancelled is raised) if it returns True.
+        each refit starts at the best fit values. The statistics are added to the fitreport and the 
+        refitted parameters (nsamples, n) are returned, with nan for failed refits.
+        """
+        if not self.fit_is_valid:
+            raise Exception('A valid fit is required to estimate the uncertainty by resampling')
+        if method not in self.BOOTSTRAPMETHODS:
+            raise Exception(f"method should be one of {', '.join(self.BOOTSTRAPMETHODS)}")
+        if self.model.method == 'odr':
+            raise Exception('Resampling is not available for the odr solver')
+
+        rng = np.random.default_rng(seed)
+        x, y, xe, ye = self.data.get()
+        npoints = len(y)
+        popt = self.popt.copy()
+        pF = self.model.fixed.copy()
+        yfit = self.model.evaluate(x, popt)
+        
+        # the errors used for weighting and for the size of the resampled noise 
+        absolute_sigma = self.model.weight == self.WEIGHTOPTIONS[2]
+        sigma = None if self.model.weight == self.WEIGHTOPTIONS[0] else ye
+        scale = np.ones(npoints) if sigma is None else sigma
+        if method == 'montecarlo' and not absolute_sigma:
+            scale = scale * np.sqrt(self.mean_squared_error / self._degrees_of_freedom())
+        normalized_residuals = (y - yfit) / scale
+
+        # resample and refit in blocks to limit the memory use
+        blocksize = max(1, min(self.BOOTSTRAP_BLOCKSIZE // npoints, -(-nsamples // 10)))
+        samples = []
+        with WorkerPool(n_jobs) as pool:  # the worker processes are reused by all blocks
+            for start in range(0, nsamples, blocksize):
+                nblock = min(blocksize, nsamples - start)
+                indices = rng.integers(0, npoints, size=(nblock, npoints))
+                xs, ss = x, sigma
+                if method == 'residual':
+                    ys = yfit + scale * normalized_residuals[indices]
+                elif method == 'pairs':
+                    xs, ys = x[indices], y[indices]
+                    ss = None if sigma is None else sigma[indices]
+                else:
+                    ys = yfit + scale * rng.normal(size=(nblock, npoints))
+                
+                pars, _, _ = batch_fit(self.model.func, xs, ys, ss, p0=popt, pF=pF, absolute_sigma=absolute_sigma, 
+                                       jac=self.model.jac, pool=pool, **self._solver_options())
+                samples.append(pars)
+                if callback is not None and callback(start + nblock, None):
+                    raise FitCancelled('The bootstrap is cancelled')
+        samples = np.concatenate(samples)
+
+        # add the statistics of the distributions to the report
+        valid = samples[np.all(np.isfinite(samples), axis=1)]
+        if len(valid) == 0:
+            raise RuntimeError('None of the refits of the resampled data converged')
+        lower, median, upper = np.percentile(valid, [50 * (1 - level), 50, 50 * (1 + level)], axis=0)
+        self.fitreport['BOOTSTRAP'] = {
+                                        'method'             : method,
+                                        'samples'            : nsamples,
+                                        'failed'             : nsamples - len(valid),
+                                        'level'              : level
+                                      }
+        for par, values in zip(self.model.fitpars, zip(valid.mean(axis=0), valid.std(axis=0, ddof=1), lower, median, upper)):
+            self.fitreport['BOOTSTRAP'][par.name] = dict(zip(('mean', 'stderr', 'lower', 'median', 'upper'), values))
+        return samples
+
+    SAMPLEROPTIONS = ('sobol', 'latinhypercube')
+
+    def multistart(self, nstarts=32, bounds=None, sampler='sobol', agree=None, n_jobs=1, seed=None, callback=None):
+        """
+        performs the fit from several initial values and keeps the fit with the lowest Smin
+        nstarts : number of initial values, the current values of the fitparameters are the first
+        bounds : list of (lower, upper) per fitparameter within which the initial values are sampled,
+                 by default value - max(|value|, 1) to value + max(|value|, 1) around the current value
+                 limited to the bounds of the fitparameter
+        sampler : 'sobol' or 'latinhypercube', see scipy.stats.qmc
+        agree : stop once this number of fits arrived at the best optimum (optional)
+        n_jobs : number of worker processes for the fits, see batch_fit()
+        seed : seed of the sampler
+        callback : optional function callback(nfits, None) called after each block of fits, the
+                   fit is cancelled (FitCancelled is raised) if it returns True.
+        the spread of the converged solutions is added to the fitreport. Returns popt and pcov as fit()
+        """
+        if sampler not in self.SAMPLEROPTIONS:
+            raise Exception(f"sampler should be one of {', '.join(self.SAMPLEROPTIONS)}")
+        if self.model.method == 'odr':
+            raise Exception('A multi-start fit is not available for the odr solver')
+        p0, pF, x, y, sigma, absolute_sigma = self._fit_inputs()
+        free = ~np.array(pF)
+        
+        # sample the initial values of the free parameters
+        options = self._solver_options()
+        if bounds is None:
+            scale = np.maximum(np.abs(p0), 1.)
+            lower, upper = p0 - scale, p0 + scale
+            if 'bounds' in options:
+                lower, upper = np.maximum(lower, options['bounds'][0]), np.minimum(upper, options['bounds'][1])
+        else:
+            lower, upper = np.array(bounds, dtype=float).T
+        from scipy.stats import qmc  # imported on first use, scipy.stats is slow to import
+        engine = qmc.Sobol if sampler == 'sobol' else qmc.LatinHypercube
+        count = nstarts - 1
+        if sampler == 'sobol':
+            count = 1 << max(count - 1, 0).bit_length()  # Sobol' points are balanced for a power of 2, scipy warns otherwise
+        unit = engine(d=int(np.count_nonzero(free)), seed=seed).random(count)[:nstarts - 1]
+        starts = np.tile(p0, (nstarts, 1))
+        starts[1:, free] = qmc.scale(unit, lower[free], upper[free]) if len(unit) else unit
+
+        # fit in blocks until all starts are fitted or enough fits agree on the best optimum
+        blocksize = max(8, 2 * get_n_jobs(n_jobs)) if agree else nstarts
+        popt, pcov, smin = np.empty((0, len(p0))), np.empty((0, len(p0), len(p0))), np.empty(0)
+        with WorkerPool(n_jobs) as pool:  # the worker processes are reused by all blocks
+            for start in range(0, nstarts, blocksize):
+                pars, covs, status = batch_fit(self.model.func, x, y, sigma, p0=starts[start:start + blocksize], pF=pF, 
+                                               absolute_sigma=absolute_sigma, jac=self.model.jac, pool=pool, **options)
+                with np.errstate(all='ignore'):
+                    residuals = y - self.model.evaluate_batch(x, np.nan_to_num(pars))
+                    if sigma is not None:
+                        residuals /= sigma
+                    chisq = np.where(status <= FIT_NOCOV, np.sum(residuals**2, axis=1), np.inf)
+                popt, pcov, smin = np.concatenate([popt, pars]), np.concatenate([pcov, covs]), np.concatenate([smin, chisq])
+                best = int(np.argmin(smin))
+                agreeing = np.isclose(smin, smin[best], rtol=1e-6) & np.all(np.isclose(popt, popt[best], rtol=1e-4, atol=1e-12), axis=1)
+                if callback is not None and callback(len(smin), None):
+                    raise FitCancelled('The fit is cancelled')
+                if agree and np.count_nonzero(agreeing) >= agree:
+                    break
+        if not np.isfinite(smin[best]):
+            raise RuntimeError('None of the fits converged')
+
+        # process results
+        self._set_result(popt[best], pcov[best], smin[best])
+        converged = popt[np.isfinite(smin)]
+        self.fitreport['MULTISTART'] = {
+                                        'sampler'            : sampler,
+                                        'starts'             : len(smin),
+                                        'converged'          : len(converged),
+                                        'at optimum'         : int(np.count_nonzero(agreeing))
+                                       }
+        for par, values in zip(self.model.fitpars, zip(converged.min(axis=0), converged.max(axis=0))):
+            self.fitreport['MULTISTART'][par.name] = dict(zip(('min', 'max'), values))
+        return popt[best], pcov[best]
 
     def _degrees_of_freedom(self):
         return int(self.data.get_numfitpoints() - self.model.get_numfitpars())
@@ -207,7 +690,7 @@ class Fitter:
                                                             'weight'             : self.model.weight,
                                                             'N'                  : self.data.get_numfitpoints(),
                                                             'dof'                : self._degrees_of_freedom(),
-                                                            't95-val'            : stats.t.ppf(0.975, self._degrees_of_freedom())
+                                                            't95-val'            : stdtrit(self._degrees_of_freedom(), 0.975)
                                                         },
                                 'FITRESULTS'            : pars_to_dict(), 
                                 'STATISTICS'            : {
@@ -218,6 +701,13 @@ class Fitter:
     def get_report(self):
         return self.fitreport
 
+    def get_solveroptions(self):
+        if self.data.xe is not None:
+            return self.SOLVEROPTIONS
+        else:
+            # no error data on x so odr is not available
+            return tuple(option for option in self.SOLVEROPTIONS if option != 'odr')
+
     def get_weightoptions(self):
         if self.data.ye is not None:
             return self.WEIGHTOPTIONS
@@ -226,55 +716,552 @@ class Fitter:
             return self.WEIGHTOPTIONS[0:1]
             
 
-def curve_fit_wrapper(func, *pargs, p0=None, pF=None, jac=None, **kwargs):
+class ParameterLayout:
+    """
+    the immutable part of the mapping of the free fit-parameters onto the full list of parameters of a 
+    function: the indices of the free parameters, the reduction of the options and the jacobian. A layout 
+    is built once for each combination of function, fixed parameters and jacobian and shared by all fits 
+    (see get_parameter_map()), the values of the parameters are held by the ParameterMap of each fit.
+    """
+
+    def __init__(self, func, pF, jac=None):
+        self.func = func
+        self.jac = jac
+        self.autojac = AutoJacobian(func, jac) if isinstance(jac, str) and jac in AutoJacobian.METHODS else None
+        self.fixed = np.array(pF, dtype=bool)
+        self.free_indices = np.flatnonzero(~self.fixed)
+        self.cov_indices = np.ix_(self.free_indices, self.free_indices)
+        self.scatter = tuple(enumerate(self.free_indices.tolist()))  # (index free par, index par)
+
+    def reduce(self, p):
+        """ returns the values of the free parameters in p """
+        return np.asarray(p, dtype=float)[self.free_indices]
+
+    def reduce_options(self, kwargs):
+        """ 
+        returns the keyword arguments of curve_fit() with the per-parameter options (bounds, x_scale, 
+        diff_step and the columns of jac_sparsity) reduced to the free parameters 
+        """
+        kwargs = dict(kwargs)
+        npars, free = len(self.fixed), self.free_indices
+        if kwargs.get('bounds') is not None:
+            kwargs['bounds'] = tuple(np.broadcast_to(np.asarray(bound, dtype=float), npars)[free] 
+                                     for bound in _bounds_pair(kwargs['bounds']))
+        for name in ('x_scale', 'diff_step'):
+            if name in kwargs and np.ndim(kwargs[name]) == 1:
+                kwargs[name] = np.asarray(kwargs[name])[free]
+        if kwargs.get('jac_sparsity') is not None:
+            sparsity = kwargs['jac_sparsity']
+            kwargs['jac_sparsity'] = sparsity[:, free] if hasattr(sparsity, 'shape') else np.asarray(sparsity)[:, free]
+        return kwargs
+
+
+class ParameterMap:
+    """
+    maps the free fit-parameters onto the full list of parameters of a function for one fit: the free 
+    parameters are scattered into a parameter list owned by the map, so concurrent fits do not share it
+    layout : the (cached) ParameterLayout of the function and the fixed parameters
+    """
+
+    def __init__(self, layout, p0=None):
+        self.layout = layout
+        self.pars = [1.] * len(layout.fixed)  # full parameter list, holds the values of fixed pars
+        if p0 is not None:
+            self.set_values(p0)
+
+    def set_values(self, p0):
+        """ sets the values of all parameters, the fixed parameters keep these values during the fit """
+        self.pars[:] = list(p0)
+
+    def reduce(self, p):
+        """ returns the values of the free parameters in p """
+        return self.layout.reduce(p)
+
+    def reduce_options(self, kwargs):
+        return self.layout.reduce_options(kwargs)
+
+    def _scatter_free(self, free):
+        pars = self.pars
+        for i, j in self.layout.scatter:
+            pars[j] = free[i]
+        return pars
+
+    def __call__(self, x, *free):
+        """ the function with only the free parameters as arguments """
+        return self.layout.func(x, *self._scatter_free(free))
+
+    def fit_jac(self, x, *free):
+        """ the jacobian with only the columns of the free parameters """
+        layout = self.layout
+        if layout.autojac is not None:
+            return layout.autojac(x, self._scatter_free(free), layout.free_indices)
+        return layout.jac(x, *self._scatter_free(free))[:, layout.free_indices]
+
+    def get_jac(self):
+        """ returns the jacobian to be passed to curve_fit() """
+        return self.fit_jac if callable(self.layout.jac) or self.layout.autojac is not None else self.layout.jac
+
+    def rebuild(self, popt, cov):
+        """ rebuilds the popt and cov of the free parameters to include the fixed parameters """
+        popt_full = np.array(self.pars, dtype=float)
+        popt_full[self.layout.free_indices] = popt
+        cov_full = np.zeros((len(popt_full), len(popt_full)))  # zero rows and columns for fixed pars
+        cov_full[self.layout.cov_indices] = cov
+        return popt_full, cov_full
+
+
+@lru_cache(maxsize=32)
+def _cached_parameter_layout(func, fixed, jac):
+    return ParameterLayout(func, fixed, jac)
+
+
+def get_parameter_map(func, pF, jac=None, p0=None):
     """ 
-    wrapper around the scipy curve_fit() function to allow parameters to be fixed 
-    same call signature as the curve_fit() function except for:
-    pF : 1D numpy array of size n, with n the number of fitparameters of the function
-    returns the popt and cov matrices just like the original curve_fit() function 
+    returns a new ParameterMap for the function func with the fixed parameters pF, and the initial values 
+    p0 if given. The ParameterLayout of the map is cached, except for unhashable models such as instances of
+    a dataclass with __call__.
+    """
+    fixed = tuple(bool(fix) for fix in pF)
+    try:
+        layout = _cached_parameter_layout(func, fixed, jac)
+    except TypeError:  # unhashable func or jac
+        layout = ParameterLayout(func, fixed, jac)
+    return ParameterMap(layout, p0)
+
+
+def _default_pars(func, p0, pF):
+    """ populate p0 and pF to default if not provided: all parameters free with initial value 1 """
+    if p0 is None or pF is None:
+        nargs = len(inspect.signature(func).parameters) - 1 if p0 is None else np.shape(p0)[-1]
+        if pF is None: pF = np.array([False for _ in range(nargs)])  # set all parameters to free
+        if p0 is None: p0 = np.array([1 for _ in range(nargs)])  # set all init values to 1
+    return p0, pF
+
+
+def _broadcast_call(func, x, stacked):
+    """ evaluates func for all rows of stacked in one call, returns None if func does not broadcast over parameter arrays """
+    try:
+        with np.errstate(all='ignore'):
+            values = np.asarray(func(x, *stacked.T[:, :, np.newaxis]), dtype=stacked.dtype)
+            if values.shape == (len(stacked), len(x)) and \
+               np.allclose(values[0], func(x, *stacked[0]), equal_nan=True):
+                return values
+    except Exception:
+        pass  # func does not broadcast
+    return None
+
+
+STACKED_BLOCKSIZE = 2**16  # number of values computed per broadcast call, keeps the temporaries of func in cache
+
+
+def evaluate_stacked(func, x, stacked, broadcasts=None):
+    """
+    evaluates func for each row of parameter values in stacked and returns an array (nrows, len(x))
+    if func broadcasts over parameter arrays, blocks of rows are evaluated in one call, otherwise row by row
+    broadcasts : True or False if known whether func broadcasts, None to try it
     """
+    if broadcasts is None:
+        values = _broadcast_call(func, x, stacked)
+        if values is not None:
+            return values
+    elif broadcasts:
+        values = np.empty((len(stacked), len(x)), dtype=stacked.dtype)
+        rows = max(1, STACKED_BLOCKSIZE // max(len(x), 1))
+        for start in range(0, len(stacked), rows):
+            values[start:start + rows] = func(x, *stacked[start:start + rows].T[:, :, np.newaxis])
+        return values
+    return np.array([func(x, *row) for row in stacked], dtype=stacked.dtype)
+
+
+COMPLEX_STEP = 1e-20  # relative step of the complex step method
+FORWARD_STEP = np.sqrt(np.finfo(float).eps)  # relative step of forward differences
+CENTRAL_STEP = np.cbrt(np.finfo(float).eps)  # relative step of central differences
+
+
+def relative_steps(values, step):
+    """ returns the steps of a numerical derivative at values: step relative to the values, but at least step """
+    return step * np.maximum(np.abs(values), 1.)
+
+
+def complex_step_agrees(complex_step, central):
+    """ 
+    returns True if the complex step derivatives agree with central differences (column by column for 2D arrays),
+    which fails for models that are not analytic, e.g. models that use abs() or the real part
+    """
+    scale = np.maximum(np.abs(central).max(axis=0, initial=0.), np.finfo(float).tiny)
+    return np.allclose(complex_step / scale, central / scale, rtol=0, atol=1e-5)
+
+
+class AutoJacobian:
+    """
+    jacobian of a model derived automatically from one stacked evaluation of the model for all parameter steps
+    method : 'complex' (complex step, exact up to rounding for models that are analytic in their parameters),
+             'forward' or 'central' (finite differences) or 'auto' (complex if the model supports it, otherwise forward)
+    only the columns of the requested (free) parameters are computed
+    """
+
+    METHODS = ('auto', 'complex', 'forward', 'central')
 
-    # extract arguments of the function func
-    __args = inspect.signature(func).parameters
-    args = [arg.name for arg in __args.values()]
+    def __init__(self, func, method='auto'):
+        if method not in self.METHODS:
+            raise Exception(f"method should be one of {', '.join(self.METHODS)}")
+        self.func = func
+        self.method = method
+        # per dtype whether func broadcasts over parameter arrays, declared by the model or probed at first use
+        declared = getattr(func, 'broadcasts', None)
+        self.broadcasts = {} if declared is None else {np.dtype(float): declared, np.dtype(complex): declared}
 
-    # populate pF and p0 to default if not provided in kwargs
-    if pF is None: pF = np.array([False for _ in args[1:]])  # set all parameters to free
-    if p0 is None: p0 = np.array([1 for _ in args[1:]])  # set all init values to 1
+    def __call__(self, x, pars, indices):
+        """ returns the jacobian (len(x), len(indices)) at pars with respect to the parameters in indices """
+        pars = np.asarray(pars, dtype=float)
+        if self.method == 'auto':
+            self.method = self._resolve(x, pars, indices)
+        if self.method == 'complex':
+            return self._complex_step(x, pars, indices)
+        if self.method == 'forward':
+            return self._forward(x, pars, indices)
+        return self._central(x, pars, indices)
 
-    # make lists of new function arguments and function arguments to be passed to original function
-    newfunc_args = [args[0]] + [arg for arg, fix in zip(args[1:], pF) if not fix]
-    orifunc_args = [args[0]] + [arg if not fix else str(p) for arg, fix, p in zip(args[1:], pF, p0)]
+    def _evaluate(self, x, stacked):
+        broadcasts = self.broadcasts.get(stacked.dtype)
+        if broadcasts is None:
+            values = _broadcast_call(self.func, x, stacked)
+            self.broadcasts[stacked.dtype] = values is not None
+            if values is not None:
+                return values
+        return evaluate_stacked(self.func, x, stacked, self.broadcasts[stacked.dtype])
 
-    # make a string defining the new function as a lambda expression and evaluate to function
-    fit_func = eval(f"lambda {', '.join(newfunc_args)} : func({', '.join(orifunc_args)})", locals())
+    def _complex_step(self, x, pars, indices):
+        nfree, rows = len(indices), np.arange(len(indices))
+        steps = relative_steps(pars[indices], COMPLEX_STEP)
+        stacked = np.tile(pars.astype(complex), (nfree, 1))
+        stacked[rows, indices] += 1j * steps
+        return (self._evaluate(x, stacked).imag / steps[:, np.newaxis]).T
 
-    # make a string defining the new jacobian function (if specified) as a lambda expression and evaluate to function
+    def _forward(self, x, pars, indices):
+        nfree, rows = len(indices), np.arange(len(indices))
+        steps = relative_steps(pars[indices], FORWARD_STEP)
+        stacked = np.tile(pars, (nfree + 1, 1))  # the last row holds the unperturbed parameters
+        stacked[rows, indices] += steps
+        steps = stacked[rows, indices] - pars[indices]  # exactly representable steps
+        values = self._evaluate(x, stacked)
+        return ((values[:nfree] - values[nfree]) / steps[:, np.newaxis]).T
+
+    def _central(self, x, pars, indices):
+        nfree, rows = len(indices), np.arange(len(indices))
+        steps = relative_steps(pars[indices], CENTRAL_STEP)
+        stacked = np.tile(pars, (2 * nfree, 1))
+        stacked[rows, indices] += steps
+        stacked[rows + nfree, indices] -= steps
+        steps = stacked[rows, indices] - stacked[rows + nfree, indices]  # exactly representable steps
+        values = self._evaluate(x, stacked)
+        return ((values[:nfree] - values[nfree:]) / steps[:, np.newaxis]).T
+
+    def _resolve(self, x, pars, indices):
+        """ returns 'complex' if the complex step jacobian of func agrees with central differences, otherwise 'forward' """
+        central = self._central(x, pars, indices)
+        try:
+            with np.errstate(all='ignore'):
+                complex_step = self._complex_step(x, pars, indices)
+        except Exception:
+            return 'forward'  # func does not accept complex parameters
+        return 'complex' if complex_step_agrees(complex_step, central) else 'forward'
+
+
+def model_jacobian(func, x, pars, indices, jac=None):
+    """
+    returns the jacobian (len(x), len(indices)) of func at pars with respect to the parameters in indices
+    the jacobian jac(x, *pars) is used if it is callable, jac can also be one of the methods of 
+    AutoJacobian, otherwise central differences are computed from one stacked evaluation
+    """
     if callable(jac):
-        indices = np.array([index for index, value in enumerate(pF) if value==False])
-        fit_jac = eval(f"lambda {', '.join(newfunc_args)} : jac({', '.join(orifunc_args)})[:, indices]", locals())
+        return np.asarray(jac(x, *pars), dtype=float).reshape(len(x), -1)[:, indices]
+    method = jac if isinstance(jac, str) and jac in AutoJacobian.METHODS else 'central'
+    return AutoJacobian(func, method)(x, pars, indices)
+
+
+def is_linear(func, options):
+    """ returns True if func is fitted directly by linear_fit(), which applies to a LinearModel without bounds """
+    return isinstance(func, LinearModel) and options.get('bounds') is None
+
+
+def _bounds_pair(bounds):
+    """ returns the (lower, upper) of bounds given as a pair or as a scipy.optimize.Bounds instance """
+    if hasattr(bounds, 'lb'):
+        return bounds.lb, bounds.ub
+    lower, upper = bounds
+    return lower, upper
+
+
+class FitCancelled(Exception):
+    """ raised when a fit is cancelled by its callback """
+
+
+def _monitored(func, callback):
+    """ 
+    returns a function that calls callback(nfev, pars) before each evaluation of func(x, *pars)
+    the fit is cancelled by raising FitCancelled if the callback returns True 
+    """
+    nfev = 0
+
+    def monitored_func(x, *pars):
+        nonlocal nfev
+        nfev += 1
+        if callback(nfev, pars):
+            raise FitCancelled('The fit is cancelled')
+        return func(x, *pars)
+    return monitored_func
+
+
+def _curve_fit(func, xdata, ydata, **kwargs):
+    """ curve_fit(), or _sparse_curve_fit() if the sparsity structure of the jacobian is given """
+    if kwargs.get('jac_sparsity') is not None:
+        return _sparse_curve_fit(func, xdata, ydata, **kwargs)
+    kwargs.pop('jac_sparsity', None)
+    return curve_fit(func, xdata, ydata, **kwargs)
+
+
+def jacobian_covariance(jacobian, smin, absolute_sigma=False):
+    """
+    returns the covariance of the fitparameters from the (weighted) jacobian (npoints, n) at the optimum as in
+    curve_fit(): the pseudo-inverse of J^T J, without the directions of the singular values of J below
+    eps * max(J.shape) times the largest one, scaled by smin / (npoints - n) unless absolute_sigma.
+    A sparse jacobian is decomposed through J^T J, so it is not copied to a dense array.
+    The covariance is filled with inf (and an OptimizeWarning is issued) if it can not be estimated.
+    """
+    npoints, npars = jacobian.shape
+    threshold = np.finfo(float).eps * max(npoints, npars)
+    if hasattr(jacobian, 'toarray'):
+        squares, vectors = np.linalg.eigh((jacobian.T @ jacobian).toarray())  # the squares of the singular values
     else:
-        fit_jac = jac
+        singular, vectorsT = np.linalg.svd(jacobian, full_matrices=False)[1:]
+        squares, vectors = singular**2, vectorsT.T
+    keep = squares > threshold**2 * squares.max(initial=0.)
+    pcov = (vectors[:, keep] / squares[keep]) @ vectors[:, keep].T
+    if not absolute_sigma:
+        if npoints > npars:
+            pcov *= smin / (npoints - npars)
+        else:
+            pcov.fill(np.inf)
+    if not np.all(np.isfinite(pcov)):
+        pcov.fill(np.inf)
+        warnings.warn('Covariance of the parameters could not be estimated', category=OptimizeWarning)
+    return pcov
+
 
-    # populate a list of initial values for free fit-parameters
-    p0_fit = np.array([p for p, fix in zip(p0, pF) if not fix])
+def _sparse_curve_fit(func, xdata, ydata, p0, sigma=None, absolute_sigma=False, jac=None, 
+                      jac_sparsity=None, method='trf', full_output=False, **kwargs):
+    """
+    curve_fit() for a jacobian with a sparsity structure, which curve_fit() does not support in its estimate
+    of the covariance. The fit is solved by least_squares() with finite differences that use jac_sparsity (or
+    with the jacobian jac if it is callable) and the covariance is computed from the jacobian at the optimum 
+    as in curve_fit().
+    """
+    from scipy.optimize import least_squares
+    if method == 'lm':
+        raise ValueError("A jacobian sparsity structure requires the 'trf' or 'dogbox' method")
+    ydata = np.asarray(ydata, dtype=float)
+    weight = None if sigma is None else 1. / np.asarray(sigma, dtype=float)
+    
+    def residuals(pars):
+        res = func(xdata, *pars) - ydata
+        return res if weight is None else res * weight
+
+    if callable(jac):
+        def jacobian(pars):
+            jacobian = np.asarray(jac(xdata, *pars), dtype=float)
+            return jacobian if weight is None else jacobian * weight[:, np.newaxis]
+        result = least_squares(residuals, p0, jac=jacobian, method=method, **kwargs)
+    else:
+        result = least_squares(residuals, p0, jac=jac or '2-point', jac_sparsity=jac_sparsity, method=method, **kwargs)
+    if not result.success:
+        raise RuntimeError('Optimal parameters not found: ' + result.message)
+
+    pcov = jacobian_covariance(result.jac, 2 * result.cost, absolute_sigma)
+    if full_output:
+        return result.x, pcov, dict(nfev=result.nfev, fvec=result.fun), result.message, result.status
+    return result.x, pcov
+
+
+def odr_wrapper(func, x, y, xe, ye=None, p0=None, pF=None, jac=None, jac_x=None, callback=None, **kwargs):
+    """
+    wrapper around odr_fit() to allow parameters to be fixed, see curve_fit_wrapper()
+    xe, ye : errors in x and y, ye is None for unit errors in y
+    jac : jacobian jac(x, *pars) of func with respect to all parameters, or one of the methods 
+          of AutoJacobian (by default 'auto')
+    jac_x : optional derivative jac_x(x, *pars) of func with respect to x
+    returns popt, pcov and Smin, the sum of the weighted orthogonal distances
+    """
+    p0, pF = _default_pars(func, p0, pF)
+    pmap = get_parameter_map(func, pF, jac if jac is not None else 'auto', p0)
+    fit_func = pmap if callback is None else _monitored(pmap, callback)
+    kwargs.pop('method', None)  # the method of least_squares() follows from the bounds
+    if kwargs.pop('jac_sparsity', None) is not None:
+        raise ValueError('A jacobian sparsity structure is not supported by the odr solver')
+    fit_slope = None if jac_x is None else lambda x, *free: jac_x(x, *pmap._scatter_free(free))
+    
+    from ._odr import odr_fit  # _odr imports from this module
+    popt, cov, smin = odr_fit(fit_func, pmap.get_jac(), x, y, xe, ye, pmap.reduce(p0), 
+                              jac_x=fit_slope, **pmap.reduce_options(kwargs))
+    return (*pmap.rebuild(popt, cov), smin)
+
+
+def curve_fit_wrapper(func, *pargs, p0=None, pF=None, jac=None, callback=None, timings=None, **kwargs):
+    """ 
+    wrapper around the scipy curve_fit() function to allow parameters to be fixed 
+    same call signature as the curve_fit() function except for:
+    pF : 1D numpy array of size n, with n the number of fitparameters of the function
+    bounds, x_scale, diff_step and jac_sparsity are given for all n parameters and reduced to the free parameters
+    callback : optional function callback(nfev, pars) called before each function evaluation with the
+               number of evaluations and the free parameters. The fit is cancelled if it returns True.
+    timings : optional Timings to record the durations of the wrapper construction, solver and covariance rebuild
+    returns the popt and cov matrices just like the original curve_fit() function, followed by 
+    infodict, mesg and ier if full_output is True
+    """
+    with stage(timings, 'wrapper'):
+        p0, pF = _default_pars(func, p0, pF)
+        pmap = get_parameter_map(func, pF, jac, p0)
+        fit_func = pmap if callback is None else _monitored(pmap, callback)
+        p0_free, fit_jac, options = pmap.reduce(p0), pmap.get_jac(), pmap.reduce_options(kwargs)
     
     # peform the fit with the reduced function
-    popt, cov = curve_fit(fit_func, *pargs, p0=p0_fit, jac=fit_jac, **kwargs)
+    with stage(timings, 'solver'):
+        popt, cov, *info = _curve_fit(fit_func, *pargs, p0=p0_free, jac=fit_jac, **options)
+    
+    with stage(timings, 'covariance'):
+        return (*pmap.rebuild(popt, cov), *info)
+
+
+# status codes of the individual fits in a batch
+FIT_OK = 0  # fit converged
+FIT_NOCOV = 1  # fit converged, but the covariance of the parameters could not be estimated
+FIT_FAILED = 2  # the solver did not converge or the model raised an error
+FIT_INVALID = 3  # the data of this fit is not valid (nan or inf values, errors <= 0 or too few datapoints)
+
+
+def _check_rows(var, nfits, npoints, name):
+    """ checks that var is a 1D array shared by all rows or a 2D array of shape (nfits, npoints) """
+    var = np.asarray(var, dtype=float)
+    if var.ndim == 1:
+        if len(var) != npoints:
+            raise Exception(f'{name} should have the same number of points as a row of ydata')
+    elif var.shape != (nfits, npoints):
+        raise Exception(f'{name} should be 1D or have the same shape as ydata')
+    return var
+
+
+def _rows(var, chunk):
+    """ returns the rows of the chunk of a 2D array, shared 1D arrays are returned as None """
+    if var is None or var.ndim == 1:
+        return None
+    return var[chunk]
+
+
+def _valid_row(x, y, sigma, nfree):
+    """ returns True if the data of a fit is finite, with positive errors, and has more points than free parameters """
+    if len(y) <= nfree or not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+        return False
+    return sigma is None or bool(np.all(np.isfinite(sigma)) and np.all(sigma > 0))
+
+
+def _fit_rows(shared, chunk):
+    """ 
+    worker that fits the rows of a chunk of a batch 
+    shared holds the model and the data shared by all rows, chunk holds the data per row 
+    """
+    func, p_shared, pF, jac, absolute_sigma, kwargs, x_shared, y_shared, s_shared = shared
+    nfits, xrows, yrows, srows, prows = chunk
     
-    # rebuild the popt and cov to include fixed parameters
-    p0_fix = [p for p, fix in zip(p0,pF) if fix]  # values of fixed parameters
-    id_fix = np.where(pF)[0]  # indices of fixed parameters
-    for id, p in zip(id_fix, p0_fix):
-        popt = np.insert(popt, id, p, axis=0)  # fill in the popt at the free fit parameters
+    # prepare the model once for all fits in the chunk
+    pmap = get_parameter_map(func, pF, jac)
+    fit_jac, kwargs = pmap.get_jac(), pmap.reduce_options(kwargs)
+    linear = is_linear(func, kwargs)
 
-    # rebuild covariance matrix to include both fixed and optimized pars
-    for id in id_fix:
-        cov = np.insert(cov, id, 0, axis=1)  # add zero rows and columns for fixed par
-        cov = np.insert(cov, id, 0, axis=0)
+    npars = len(pF)
+    popt = np.full((nfits, npars), np.nan)
+    pcov = np.full((nfits, npars, npars), np.nan)
+    status = np.full(nfits, FIT_INVALID, dtype=int)
+    nfree = npars - int(np.count_nonzero(pF))
 
-    return popt, cov    
+    # a missing covariance is reported by the status, curve_fit() also warns about it
+    for i in range(nfits):
+        x = x_shared if xrows is None else xrows[i]
+        y = y_shared if yrows is None else yrows[i]
+        s = s_shared if srows is None else srows[i]
+        p0 = p_shared if prows is None else prows[i]
+        if not _valid_row(x, y, s, nfree):
+            continue  # status remains FIT_INVALID
+        try:
+            if linear:
+                popt[i], pcov[i], _ = linear_fit(func, x, y, s, p0, pF, absolute_sigma)
+                status[i] = FIT_OK if np.all(np.isfinite(pcov[i])) else FIT_NOCOV
+                continue
+            pmap.set_values(p0)
+            p, c = _curve_fit(pmap, x, y, p0=pmap.reduce(p0), sigma=s, 
+                             absolute_sigma=absolute_sigma, jac=fit_jac, **kwargs)
+        except Exception:
+            status[i] = FIT_FAILED  # no convergence or an error in the model, the other rows are still fitted
+            continue
+        popt[i], pcov[i] = pmap.rebuild(p, c)
+        status[i] = FIT_OK if np.all(np.isfinite(c)) else FIT_NOCOV
+
+    return popt, pcov, status
+
+
+def batch_fit(func, xdata, ydata, sigma=None, p0=None, pF=None, absolute_sigma=False, jac=None,
+              n_jobs=1, chunksize=None, pool=None, **kwargs):
+    """
+    fits the function func to each row of a 2D stack of ydata
+    the model is prepared once and reused for all fits in the chunk. A failing fit 
+    does not abort the batch, instead the status code of the fit is set and its popt and pcov are 
+    filled with nan.
+    xdata : 1D array shared by all rows or 2D array of the same shape as ydata
+    ydata : 2D array of shape (nfits, npoints), or a 1D array fitted from each row of a 2D p0
+    sigma : None, 1D array shared by all rows or 2D array of the same shape as ydata
+    p0 : initial values shared by all fits or a 2D array with the initial values (nfits, n) per fit
+    pF, absolute_sigma, jac : see curve_fit_wrapper(), identical for all fits
+    n_jobs : number of worker processes used for the fits (-1 for all cpu cores). Requires func 
+             (and jac) to be defined at module level, otherwise the fits are performed in this process.
+    chunksize : number of rows send to a worker at once, by default about four chunks per worker
+    pool : WorkerPool of which the worker processes are used instead of n_jobs, to reuse the processes
+           in a series of batches
+    returns the popt (nfits, n) and pcov (nfits, n, n) arrays and the status codes (nfits,) 
+    """
+    p0, pF = _default_pars(func, p0, pF)
+    p0 = np.asarray(p0, dtype=float)
+    ydata = np.asarray(ydata, dtype=float)
+    if ydata.ndim == 1 and p0.ndim == 2:
+        nfits, npoints = len(p0), len(ydata)  # one dataset fitted from several initial values
+    elif ydata.ndim == 2:
+        nfits, npoints = ydata.shape
+    else:
+        raise Exception('ydata should be a 2D array with one dataset per row')
+    if p0.ndim == 2 and len(p0) != nfits:
+        raise Exception('p0 should have one row of initial values per dataset')
+    xdata = _check_rows(xdata, nfits, npoints, 'xdata')
+    if sigma is not None:
+        sigma = _check_rows(sigma, nfits, npoints, 'sigma')
 
+    if npoints - (len(pF) - np.count_nonzero(pF)) <= 0:
+        raise Exception('The number of datapoints should exceed the number of free fitparameters')
+
+    shared = (func, p0 if p0.ndim == 1 else None, pF, jac, absolute_sigma, kwargs,
+              xdata if xdata.ndim == 1 else None,
+              ydata if ydata.ndim == 1 else None,
+              sigma if sigma is not None and sigma.ndim == 1 else None)
+
+    n_jobs = pool.n_jobs if pool is not None else get_n_jobs(n_jobs)
+    if n_jobs > 1 and not is_picklable(shared[:6]):
+        warnings.warn('The fit function cannot be send to worker processes (define it at module level), '
+                      'the fits are performed in a single process.')
+        n_jobs, pool = 1, None
+
+    chunks = [(chunk.stop - chunk.start, _rows(xdata, chunk), _rows(ydata, chunk), _rows(sigma, chunk), _rows(p0, chunk)) 
+              for chunk in split_chunks(nfits, n_jobs, chunksize)]
+    results = run_chunks(_fit_rows, shared, chunks, n_jobs, pool)
+
+    popt, pcov, status = (np.concatenate(res) for res in zip(*results))
+    return popt, pcov, status
             
 def value_to_string(name, value, error, fixed):
     
@@ -330,6 +1317,51 @@ def value_to_string(name, value, error, fixed):
     return combined
 
 
+def decimate_minmax(xsorted, ysorted, xmin, xmax, ncolumns):
+    """
+    returns the indices of the points to plot for the view xmin <= x <= xmax that is ncolumns 
+    pixels wide. Per pixel column the first, last, minimum and maximum point are kept, which 
+    preserves the visual envelope of the data. If the view holds only a few points per column, 
+    all points in the view are returned.
+    xsorted : x-values sorted in increasing order
+    ysorted : y-values in the same order as xsorted
+    """
+    i0 = np.searchsorted(xsorted, xmin, side='left')
+    i1 = np.searchsorted(xsorted, xmax, side='right')
+    ncolumns = max(1, int(ncolumns))
+    if i1 - i0 <= 4 * ncolumns:
+        return np.arange(i0, i1)
+
+    # boundaries of the columns, only non-empty columns are used
+    bounds = i0 + np.searchsorted(xsorted[i0:i1], np.linspace(xmin, xmax, ncolumns + 1)[1:-1])
+    bounds = np.unique(np.concatenate(([i0], bounds, [i1])))
+    starts, ends = bounds[:-1], bounds[1:]
+
+    # index of the first minimum and maximum in each column, computed for blocks of columns 
+    # to limit the temporary arrays for large (memory-mapped) data
+    indices = [starts, ends - 1]
+    first = 0
+    while first < len(starts):
+        last = max(first + 1, int(np.searchsorted(ends, starts[first] + CHUNKSIZE, side='right')))
+        indices += _column_extremes(ysorted, starts[first:last], ends[first:last])
+        first = last
+    return np.unique(np.concatenate(indices))
+
+
+def _column_extremes(ysorted, starts, ends):
+    """ returns the indices of the first minimum and the first maximum of ysorted in each column starts:ends """
+    i0 = starts[0]
+    y = np.asarray(ysorted[i0:ends[-1]])
+    columns = np.repeat(np.arange(len(starts)), ends - starts)
+    indices = []
+    for reduce in (np.fmin, np.fmax):
+        extremes = reduce.reduceat(y, starts - i0)
+        hits = np.flatnonzero(y == extremes[columns])
+        if len(hits):
+            indices.append(i0 + hits[np.minimum(np.searchsorted(hits, starts - i0), len(hits) - 1)])
+    return indices
+
+
 def float_to_str(value, digits):
     """
     return a string reps of a value in scientific notation with the number
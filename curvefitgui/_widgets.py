@@ -13,26 +13,47 @@ import matplotlib.patches as patches
 from matplotlib import rcParams
 
 from ._settings import settings
-from ._tools import float_to_str
+from ._tools import float_to_str, decimate_minmax
+from ._ingest import is_sorted
 
 
 rcParams['mathtext.fontset'] = 'cm'
 
 
+def _refresh_interval():
+    """ returns the refresh interval of the screen in ms, used to coalesce mouse-motion events """
+    screen = QtWidgets.QApplication.primaryScreen() if QtWidgets.QApplication.instance() else None
+    rate = screen.refreshRate() if screen is not None else 0
+    if rate <= 0:
+        rate = 60.
+    return max(1, int(1000. / rate))
+
+
 class DraggableVLine:
-    """ class to create a draggable vertical line in a plot """
+    """ 
+    class to create a draggable vertical line in a plot 
+    while dragging, the background is cached and only the line (and the artists of the optional 
+    on_move callback) are redrawn (blitted) at most once per screen refresh
+    """
 
     lock = None  # we need this to be able to dragg only one line at a time
 
-    def __init__(self, ax, x, linewidth=4, linestyle='--', color='gray'):
+    def __init__(self, ax, x, linewidth=4, linestyle='--', color='gray', on_move=None):
         self.line = ax.axvline(x=x, linewidth=linewidth, linestyle=linestyle, color=color)
         self.press = None
+        self.background = None  # cached figure without the animated artists
+        self._pending = False  # a redraw is scheduled at the next screen refresh
+        self.on_move = on_move  # callback returning a list of additional artists to redraw
+        self.timer = self.line.figure.canvas.new_timer(interval=_refresh_interval())
+        self.timer.single_shot = True
+        self.timer.add_callback(self.blit)
         self.connect()
         
     def get_pos(self):
         return self.line.get_xdata()[0]
 
     def remove(self):
+        self.disconnect()
         self.line.remove()
 
     def connect(self):
@@ -41,6 +62,11 @@ class DraggableVLine:
         self.cidrelease = self.line.figure.canvas.mpl_connect('button_release_event', self.on_release)
         self.cidmotion = self.line.figure.canvas.mpl_connect('motion_notify_event', self.on_motion)
         
+    def _animated_artists(self):
+        artists = [self.line]
+        if self.on_move is not None:
+            artists += self.on_move(self)
+        return artists
 
     def on_press(self, event):
         if event.inaxes != self.line.axes: return
@@ -51,6 +77,14 @@ class DraggableVLine:
         self.press = x, event.xdata
         DraggableVLine.lock = self
 
+        # draw the figure once without the animated artists and cache it as background
+        canvas = self.line.figure.canvas
+        for artist in self._animated_artists():
+            artist.set_animated(True)
+        canvas.draw()
+        self.background = canvas.copy_from_bbox(self.line.figure.bbox)
+        self.blit()
+
     def on_motion(self, event):
         if self.press is None: return
         if DraggableVLine.lock is not self: return
@@ -59,12 +93,29 @@ class DraggableVLine:
         dx = event.xdata - xpress
         x_clip = x + dx
         self.line.set_xdata([x_clip, x_clip])
-        self.line.figure.canvas.draw()
+        if not self._pending:
+            self._pending = True
+            self.timer.start()  # redraw at the next screen refresh, later motion events are coalesced
+
+    def blit(self):
+        """ restores the background and redraws only the animated artists """
+        self._pending = False
+        if self.background is None: return
+        canvas = self.line.figure.canvas
+        canvas.restore_region(self.background)
+        for artist in self._animated_artists():
+            artist.axes.draw_artist(artist)
+        canvas.blit(self.line.figure.bbox)
 
     def on_release(self, event):
         if DraggableVLine.lock is not self: return
         DraggableVLine.lock = None
         self.press = None
+        self.timer.stop()
+        self._pending = False
+        for artist in self._animated_artists():
+            artist.set_animated(False)
+        self.background = None
         self.line.figure.canvas.draw()
 
     def disconnect(self):
@@ -74,12 +125,30 @@ class DraggableVLine:
 
 
 class RangeSelector:
-    """ class that creates a rangeselector in a plot consisting of two draggable vertical lines """
+    """ 
+    class that creates a rangeselector in a plot consisting of two draggable vertical lines 
+    and a readout of the number of datapoints x within the range
+    """
 
-    def __init__(self, ax, pos1, pos2):
+    def __init__(self, ax, pos1, pos2, x):
         self.ax = ax  # axes that holds the lines
         self.pos = [pos1, pos2] # initial positions of the lines
-        self.drag_lines = [DraggableVLine(self.ax, pos) for pos in self.pos]
+        
+        # sorted x-values to count the selected points with a binary search
+        x = np.asarray(x)
+        self.xsorted = x if is_sorted(x) else np.sort(x)
+        
+        self.readout = self.ax.text(0.02, 0.97, '', transform=self.ax.transAxes, va='top',
+                                    fontname=settings['TEXT_FONT'], size=settings['TEXT_SIZE'],
+                                    bbox=dict(boxstyle='round', fc='white', alpha=0.7))
+        self.drag_lines = [DraggableVLine(self.ax, pos, on_move=self._update_readout) for pos in self.pos]
+        self._update_readout()
+
+    def _update_readout(self, dragline=None):
+        xmin, xmax = self.get_range()
+        count = np.searchsorted(self.xsorted, xmax, side='right') - np.searchsorted(self.xsorted, xmin, side='left')
+        self.readout.set_text(f'selected points: {count}')
+        return [self.readout]
 
     def get_range(self):
         pos = [dragline.get_pos() for dragline in self.drag_lines]
@@ -89,14 +158,16 @@ class RangeSelector:
     def remove(self):
         for dragline in self.drag_lines:
             dragline.remove()
+        self.readout.remove()
 
 
 class PlotWidget(QtWidgets.QWidget):
     """ Qt widget to hold the matplotlib canvas and the tools for interacting with the plots """
     
     resized = QtCore.pyqtSignal()  # emits when the widget is resized
+    dataset_changed = QtCore.pyqtSignal(int)  # emits the index of the dataset selected by the user
     
-    def __init__(self, data, xlabel, ylabel):
+    def __init__(self, data, xlabel, ylabel, labels=None):
         QtWidgets.QWidget.__init__(self)
 
         self.setLayout(QtWidgets.QVBoxLayout())
@@ -111,6 +182,14 @@ class PlotWidget(QtWidgets.QWidget):
 
         self.toolbar.addAction(self.ACshowselector)
 
+        # selector of the dataset shown in a global fit of several datasets
+        if labels is not None:
+            self.toolbar.addSeparator()
+            self.datasetbox = QtWidgets.QComboBox()
+            self.datasetbox.addItems(labels)
+            self.datasetbox.currentIndexChanged.connect(self.dataset_changed)
+            self.toolbar.addWidget(self.datasetbox)
+
         self.toolbar.addSeparator()
         self.layout().addWidget(self.toolbar)
         self.layout().addWidget(self.canvas)
@@ -124,6 +203,10 @@ class PlotWidget(QtWidgets.QWidget):
 
     def update_plot(self):
         self.canvas.update_plot()
+
+    def set_data(self, data):
+        """ shows another dataset """
+        self.canvas.set_data(data)
            
 
     def _toggle_showselector(self):
@@ -136,6 +219,9 @@ class PlotCanvas(FigureCanvas):
         self.data = data  # contains the x, y and error data
         self.fitline = None  # contains the fitline if available
         self.residuals = None  # contains the residuals if available
+        self.bands = None  # contains the confidence and prediction bands if available
+        self.confidence_band = None
+        self.prediction_band = None
 
         # setup the FigureCanvas
         self.fig = Figure(dpi=settings['FIG_DPI'], tight_layout=True)
@@ -176,18 +262,15 @@ class PlotCanvas(FigureCanvas):
         self.result_box = self.ax1.annotate('', xy=(0.5, 0.5), xycoords='axes fraction', fontname=settings['TEXT_FONT'], size=settings['TEXT_SIZE'], bbox=bbox_args)
         self.result_box.draggable()
 
-        # populate plotlines
-        self.data_line.set_data(self.data.x, self.data.y) 
-        
-        # create errorbars if required
-        if self.data.ye is not None:
-            self.yerrobar = self.ax1.errorbar(self.data.x, self.data.y, yerr=self.data.ye, 
-                                        fmt='none', color=settings['BAR_Y_COLOR'], elinewidth=settings['BAR_Y_THICKNESS'],
-                                        capsize=2)
-        if self.data.xe is not None:
-            self.xerrobar = self.ax1.errorbar(self.data.x, self.data.y, xerr=self.data.xe, 
-                                        fmt='none', color=settings['BAR_X_COLOR'], elinewidth=settings['BAR_X_THICKNESS'],
-                                        capsize=2)                                
+        # in live preview mode only the fitted line and residuals are redrawn (blitted) on a cached background
+        self.previewing = False
+        self.background = None
+        self.mpl_connect('draw_event', self._on_draw_event)
+
+        # populate plotlines and create errorbars if required
+        self.yerrobar = None
+        self.xerrobar = None
+        self._init_data()
 
         # set the ticklabel properties
         for labels in [self.ax1.get_xticklabels(), self.ax1.get_yticklabels(), 
@@ -198,6 +281,145 @@ class PlotCanvas(FigureCanvas):
                 tick.set_fontsize(settings['TICK_SIZE']) 
 
 
+    def _init_data(self):
+        # level of detail: datasets with many points are decimated to the current view, the
+        # decimation uses the data sorted on x-values (order is None if the data is already sorted)
+        self.lod = len(self.data.x) > settings['PLOT_MAX_POINTS']
+        self.order = None
+        if self.lod:
+            if not is_sorted(self.data.x):
+                self.order = np.argsort(self.data.x, kind='stable')
+            self.xsorted = self._sorted(self.data.x)
+            self.ysorted = self._sorted(self.data.y)
+        self.sampled_view = None  # (xmin, xmax, width) of the view the plotted data is decimated for
+        self._plot_data(self._view_indices(self.ysorted, full=True) if self.lod else None)
+
+    def set_data(self, data):
+        """ 
+        shows another dataset, the fitted line, residuals and bands are cleared and the range 
+        selector is placed at the fitrange of the dataset if it has one
+        """
+        self.data = data
+        self.set_fitline(None)
+        self.set_residuals(None)
+        self.set_bands(None)
+        self.fitted_line.set_data([], [])
+        self.residual_line.set_data([], [])
+        if self.range_selector is not None:
+            self.range_selector.remove()
+            self.range_selector = None
+        self._init_data()
+        if len(data.ranges) == 1 and np.all(np.isfinite(data.ranges[0])):
+            self.range_selector = RangeSelector(self.ax1, *data.ranges[0], self.data.x)
+
+    def _sorted(self, var):
+        """ returns var in the order of increasing x-values """
+        return var if self.order is None else var[self.order]
+
+    def _view_indices(self, ysorted, full=False):
+        """ returns the indices in the sorted data of the points to plot for the current (or full) view """
+        if full:
+            xmin, xmax = self.xsorted[0], self.xsorted[-1]
+        else:
+            xmin, xmax = self.ax1.get_xlim()
+        self.sampled_view = (xmin, xmax, self.ax1.bbox.width)
+        return decimate_minmax(self.xsorted, ysorted, xmin, xmax, self.ax1.bbox.width)
+
+    def _plot_data(self, indices=None):
+        """ plots the data and errorbars, only the points at indices of the sorted data if specified """
+        x, y, xe, ye = self.data.x, self.data.y, self.data.xe, self.data.ye
+        if indices is not None:
+            if self.order is not None:
+                indices = self.order[indices]
+            x, y = x[indices], y[indices]
+            xe = xe[indices] if xe is not None else None
+            ye = ye[indices] if ye is not None else None
+        self.data_line.set_data(x, y)
+
+        for errorbar in (self.yerrobar, self.xerrobar):
+            if errorbar is not None:
+                errorbar.remove()
+        self.yerrobar, self.xerrobar = None, None
+        if ye is not None:
+            self.yerrobar = self.ax1.errorbar(x, y, yerr=ye, 
+                                        fmt='none', color=settings['BAR_Y_COLOR'], elinewidth=settings['BAR_Y_THICKNESS'],
+                                        capsize=2)
+        if xe is not None:
+            self.xerrobar = self.ax1.errorbar(x, y, xerr=xe, 
+                                        fmt='none', color=settings['BAR_X_COLOR'], elinewidth=settings['BAR_X_THICKNESS'],
+                                        capsize=2)                                
+
+    def _plot_residuals(self, full=False):
+        """ plots the residuals, decimated to the current (or full) view for large datasets """
+        if self.lod:
+            indices = self._view_indices(self.rsorted, full)
+            self.residual_line.set_data(self.xsorted[indices], self.rsorted[indices])
+            return
+        
+        # sort data if required    
+        if settings['SORT_RESIDUALS']:
+            order = np.argsort(self.data.x)
+        else:
+            order = np.arange(0, len(self.data.x))    
+        self.residual_line.set_data(self.data.x[order], self.residuals[order])
+
+    def _resample_view(self):
+        """ resamples the data and residuals if the user zoomed or panned since the last sampling """
+        view = (*self.ax1.get_xlim(), self.ax1.bbox.width)
+        if view == self.sampled_view:
+            return
+        self._plot_data(self._view_indices(self.ysorted))
+        if self.residuals is not None:
+            self._plot_residuals()
+
+    def draw(self):
+        if self.lod:
+            self._resample_view()
+        super().draw()
+
+    def start_preview(self):
+        """ starts the live preview mode """
+        self.previewing = True
+        self.disable_results_box()
+        self.set_bands(None)
+        self._plot_bands()
+        for line in (self.fitted_line, self.residual_line):
+            line.set_animated(True)
+        if self.zero_res is None:
+            self.zero_res = self.ax2.axhline(y=0, linestyle='--', color='black')
+        self.redraw()
+
+    def end_preview(self):
+        """ ends the live preview mode and draws the full figure """
+        self.previewing = False
+        self.background = None
+        for line in (self.fitted_line, self.residual_line):
+            line.set_animated(False)
+        self.redraw()
+
+    def _on_draw_event(self, event):
+        """ caches the background after a full draw and adds the animated preview lines """
+        if self.previewing:
+            self.background = self.copy_from_bbox(self.fig.bbox)
+            self._draw_preview_lines()
+
+    def _draw_preview_lines(self):
+        for line in (self.fitted_line, self.residual_line):
+            line.axes.draw_artist(line)
+
+    def show_preview(self, fitline, residuals):
+        """ updates only the fitted line and the residuals """
+        self.set_fitline(fitline)
+        self.set_residuals(residuals)
+        self.fitted_line.set_data(fitline[0], fitline[1])
+        self._plot_residuals()
+        if self.background is None:
+            self.redraw()
+            return
+        self.restore_region(self.background)
+        self._draw_preview_lines()
+        self.blit(self.fig.bbox)
+
     def set_results_box(self, text, loc):
         self.result_box.set_text(text)
         self.result_box.set_visible(True)
@@ -207,7 +429,7 @@ class PlotCanvas(FigureCanvas):
 
     def toggle_rangeselector(self):
         if self.range_selector is None:
-            self.range_selector = RangeSelector(self.ax1, np.min(self.data.x), np.max(self.data.x))
+            self.range_selector = RangeSelector(self.ax1, np.min(self.data.x), np.max(self.data.x), self.data.x)
             self.redraw()
         else:
             self.range_selector.remove()
@@ -216,10 +438,31 @@ class PlotCanvas(FigureCanvas):
     
     def set_residuals(self, residuals):
         self.residuals = residuals
+        if self.lod and residuals is not None:
+            self.rsorted = self._sorted(residuals)
 
     def set_fitline(self, fitline):
         self.fitline = fitline        
 
+    def set_bands(self, bands):
+        """ bands : (xcurve, ycurve, confidence, prediction) as returned by Fitter.get_bands() or None """
+        self.bands = bands
+
+    def _plot_bands(self):
+        for band in (self.confidence_band, self.prediction_band):
+            if band is not None:
+                band.remove()
+        self.confidence_band = self.prediction_band = None
+        if self.bands is None:
+            return
+        x, y, confidence, prediction = self.bands
+        if settings['BANDS_SHOW'] in ('prediction', 'both'):
+            self.prediction_band = self.ax1.fill_between(x, y - prediction, y + prediction, lw=0, 
+                                                         color=settings['BANDS_COLOR'], alpha=settings['BANDS_ALPHA'] / 2)
+        if settings['BANDS_SHOW'] in ('confidence', 'both'):
+            self.confidence_band = self.ax1.fill_between(x, y - confidence, y + confidence, lw=0,
+                                                         color=settings['BANDS_COLOR'], alpha=settings['BANDS_ALPHA'])
+
     def get_range(self):
         if self.range_selector is None:
             self.data.set_mask(-np.inf, np.inf)
@@ -232,18 +475,17 @@ class PlotCanvas(FigureCanvas):
         if self.residuals is not None:
             # if the zero residual line is not yet created, do so
             if self.zero_res is None:
-                self.ax2.axhline(y=0, linestyle='--', color='black')
-            
-            # sort data if required    
-            if settings['SORT_RESIDUALS']:
-                order = np.argsort(self.data.x)
-            else:
-                order = np.arange(0, len(self.data.x))    
+                self.zero_res = self.ax2.axhline(y=0, linestyle='--', color='black')
             
-            self.residual_line.set_data(self.data.x[order], self.residuals[order])
+            self._plot_residuals(full=True)
         
         if self.fitline is not None:
             self.fitted_line.set_data(self.fitline[0], self.fitline[1])
+        self._plot_bands()
+
+        # autoscaling requires the decimated data of the full view
+        if self.lod:
+            self._plot_data(self._view_indices(self.ysorted, full=True))
        
         # rescale the axis
         self.ax1.relim()
@@ -266,30 +508,91 @@ class PlotCanvas(FigureCanvas):
 
 class ParamWidget(QtWidgets.QWidget):
     """ Qt widget to show and change a fitparameter """
+
+    changed = QtCore.pyqtSignal()  # emits when the user types or drags a new value
+    SLIDER_STEPS = 500  # number of slider steps on each side of the center value
+
     def __init__(self, par):
         QtWidgets.QWidget.__init__(self)  
         self.par = par
         self.label = QtWidgets.QLabel(par.name)
         self.edit = QtWidgets.QLineEdit('')
+        self.slider = QtWidgets.QSlider(QtCore.Qt.Orientation.Horizontal)
+        self.slider.setRange(-self.SLIDER_STEPS, self.SLIDER_STEPS)
+        self.slider.hide()  # only shown in live preview mode
         self.update_value()
         self.check = QtWidgets.QCheckBox('fix')
+        self.lower = QtWidgets.QLineEdit('')  # bounds of the value, empty for no bound
+        self.upper = QtWidgets.QLineEdit('')
+        self.lower.setPlaceholderText('min')
+        self.upper.setPlaceholderText('max')
+        for edit in (self.lower, self.upper):
+            edit.setMaximumWidth(80)
+        self.update_bounds()
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(self.label)
         layout.addWidget(self.edit)
+        layout.addWidget(self.slider)
+        layout.addWidget(self.lower)
+        layout.addWidget(self.upper)
         layout.addWidget(self.check)
         self.setLayout(layout)
+        self.edit.textEdited.connect(self._text_edited)
+        self.slider.valueChanged.connect(self._slider_moved)
 
     def read_value(self):
         """ read userinput (value and fixed) in the parameter data """
         self.par.value = float(self.edit.text())
         self.par.fixed = self.check.isChecked()
+        self.par.lower = float(self.lower.text()) if self.lower.text().strip() else -np.inf
+        self.par.upper = float(self.upper.text()) if self.upper.text().strip() else np.inf
         return None
 
+    def get_value(self):
+        """ returns the value entered by the user without changing the parameter data """
+        return float(self.edit.text())
+
     def update_value(self):
         value = self.par.value
         self.edit.setText(float_to_str(value, settings['SIGNIFICANT_DIGITS']))
+        self._center_slider(value)
         return None        
 
+    def set_par(self, par):
+        """ shows and changes another fitparameter """
+        self.par = par
+        self.update_value()
+        self.update_bounds()
+        self.check.setChecked(par.fixed)
+
+    def update_bounds(self):
+        for edit, bound in ((self.lower, self.par.lower), (self.upper, self.par.upper)):
+            edit.setText(float_to_str(bound, settings['SIGNIFICANT_DIGITS']) if np.isfinite(bound) else '')
+
+    def set_slider_visible(self, visible):
+        self.slider.setVisible(visible)
+
+    def _center_slider(self, value):
+        """ centers the slider at value, the slider range is relative to value """
+        self.center = value
+        self.span = settings['SLIDER_RANGE'] * (abs(value) if value != 0 else 1.)
+        self.slider.blockSignals(True)
+        self.slider.setValue(0)
+        self.slider.blockSignals(False)
+
+    def _text_edited(self, text):
+        try:
+            value = float(text)
+        except ValueError:
+            return
+        self._center_slider(value)
+        self.changed.emit()
+
+    def _slider_moved(self, position):
+        value = self.center + self.span * position / self.SLIDER_STEPS
+        self.edit.setText(float_to_str(value, settings['SIGNIFICANT_DIGITS']))
+        self.changed.emit()
+
 
 class ReportWidget(QtWidgets.QTextEdit):
     """ prints a fitreport in a non-editable textbox. Report should be a (nested) dictionary """
@@ -320,31 +623,167 @@ class ReportWidget(QtWidgets.QTextEdit):
         print_dict(fitreport, 1)      
 
 
+class LandscapeWidget(QtWidgets.QWidget):
+    """ 
+    Qt widget that shows a profile or a map of the increase of Smin (see Landscape) for chosen fitparameters. 
+    A grid is requested by the COMPUTE button and, once a grid is shown, by zooming or panning the plot.
+    """
+
+    requested = QtCore.pyqtSignal(object)  # dict with the parameters, ranges, number of points and mode of the grid
+    MAP_LEVELS = (2.30, 6.18, 11.83)  # increase of Smin at 1, 2 and 3 standard deviations for two parameters
+    VIEW_DELAY = 300  # delay in ms after the last change of the view before the grid of the view is requested
+
+    def __init__(self, names, modes):
+        QtWidgets.QWidget.__init__(self)
+        self.names = names
+        self.shown = None  # the request of the shown grid
+        self._drawing = False  # the view is set by the widget itself
+
+        self.par1box = QtWidgets.QComboBox()
+        self.par1box.addItems(names)
+        self.par2box = QtWidgets.QComboBox()
+        self.par2box.addItems(['(profile)'] + names)
+        self.par2box.setToolTip('second parameter of a map, or (profile) for the profile of the first parameter')
+        self.modebox = QtWidgets.QComboBox()
+        self.modebox.addItems(modes)
+        self.modebox.setToolTip('fixed: other parameters at their fitted values, profile: other parameters refitted')
+        self.pointsbox = QtWidgets.QSpinBox()
+        self.pointsbox.setRange(3, 1001)
+        self.pointsbox.setValue(settings['LANDSCAPE_NUMPOINTS'])
+        self.pointsbox.setToolTip('number of grid points per parameter')
+        self.computebutton = QtWidgets.QPushButton('COMPUTE', clicked = lambda: self._request(view=False))
+        controls = QtWidgets.QHBoxLayout()
+        for widget in (self.par1box, QtWidgets.QLabel('vs'), self.par2box, self.modebox, QtWidgets.QLabel('points:'), 
+                       self.pointsbox, self.computebutton):
+            controls.addWidget(widget)
+
+        self.fig = Figure(dpi=settings['FIG_DPI'], tight_layout=True)
+        self.canvas = FigureCanvas(self.fig)
+        self.canvas.setMinimumHeight(250)
+        self.ax = self.fig.add_subplot(111)
+        self.toolbar = NavigationToolbar(self.canvas, self)
+        self.viewtimer = QtCore.QTimer()
+        self.viewtimer.setSingleShot(True)
+        self.viewtimer.setInterval(self.VIEW_DELAY)
+        self.viewtimer.timeout.connect(lambda: self._request(view=True))
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+        self.clear()
+
+    def _clear_axes(self):
+        """ clears the axes, which also removes their callbacks """
+        self.ax.clear()
+        self.ax.callbacks.connect('xlim_changed', self._view_changed)
+        self.ax.callbacks.connect('ylim_changed', self._view_changed)
+
+    def _view_changed(self, ax):
+        """ schedules the grid of the new view once the user stopped zooming or panning """
+        if not self._drawing and self.shown is not None:
+            self.viewtimer.start()
+
+    def _request(self, view):
+        """ requests the grid of the selected parameters, on the current view of the plot if view is True """
+        if view:
+            request = dict(self.shown, range1=self.ax.get_xlim())
+            if request['index2'] is not None:
+                request['range2'] = self.ax.get_ylim()
+            elif request['range1'] == self.shown['range1']:
+                return  # only the vertical axis of a profile changed
+        else:
+            index2 = self.par2box.currentIndex() - 1
+            request = dict(index1=self.par1box.currentIndex(), index2=None if index2 < 0 else index2, 
+                           range1=(None, None), range2=(None, None), numpoints=self.pointsbox.value(), 
+                           mode=self.modebox.currentText())
+        self.requested.emit(request)
+
+    def clear(self):
+        """ removes the shown grid, e.g. after a new fit """
+        self.viewtimer.stop()
+        self.shown = None
+        self._drawing = True
+        self._clear_axes()
+        self.ax.text(0.5, 0.5, 'select parameters and press COMPUTE', ha='center', va='center', transform=self.ax.transAxes,
+                     fontname=settings['TEXT_FONT'], fontsize=settings['TEXT_SIZE'])
+        self.ax.set_axis_off()
+        self.canvas.draw_idle()
+        self._drawing = False
+
+    def show_grid(self, request, popt, values1, values2, delta):
+        """ 
+        shows the increase of Smin delta as a profile (values2 is None) or as a map (len(values2), len(values1)),
+        popt are the fitted values of the parameters of the grid
+        """
+        self._drawing = True
+        self._clear_axes()
+        self.ax.set_axis_on()
+        textprops = dict(fontname=settings['TEXT_FONT'], fontsize=settings['TEXT_SIZE'])
+        self.ax.set_xlabel(self.names[request['index1']], **textprops)
+        if values2 is None:
+            self.ax.grid()
+            self.ax.plot(values1, delta, color='black', marker='.', lw=1)
+            self.ax.axhline(1., linestyle='--', color='gray')  # one standard deviation
+            self.ax.set_ylabel(r'$\Delta\chi^2$', **textprops)
+            self.ax.set_xlim(values1[0], values1[-1])
+        else:
+            self.ax.pcolormesh(values1, values2, delta, shading='nearest', cmap='viridis_r', vmin=0, vmax=2 * self.MAP_LEVELS[-1])
+            contours = self.ax.contour(values1, values2, delta, levels=self.MAP_LEVELS, colors='white', linewidths=1)
+            self.ax.clabel(contours, fmt={level: f'{i + 1}$\\sigma$' for i, level in enumerate(self.MAP_LEVELS)})
+            self.ax.plot(*popt, color='white', marker='+', markersize=12)
+            self.ax.set_ylabel(self.names[request['index2']], **textprops)
+            self.ax.set_xlim(values1[0], values1[-1])
+            self.ax.set_ylim(values2[0], values2[-1])
+        self.shown = dict(request, range1=self.ax.get_xlim(), range2=self.ax.get_ylim() if values2 is not None else (None, None))
+        self.canvas.draw_idle()
+        self.toolbar.update()  # the home view of the toolbar is the new grid
+        self._drawing = False
+
+
 class ModelWidget(QtWidgets.QGroupBox):
     """ Qt widget to show and control the fit model """
+
+    changed = QtCore.pyqtSignal()  # emits when the user changes the value of a parameter
     
-    def __init__(self, model, weightoptions):
+    def __init__(self, model, weightoptions, solveroptions):
         self.model = model
         QtWidgets.QGroupBox.__init__(self, 'Model settings')
-        self.initGUI(weightoptions)
+        self.initGUI(weightoptions, solveroptions)
         self.set_weight()
+        self.set_method()
 
-    def initGUI(self, weightoptions):
+    def initGUI(self, weightoptions, solveroptions):
         VBox = QtWidgets.QVBoxLayout()
         HBox = QtWidgets.QHBoxLayout()
         self.parviews = [ParamWidget(par) for par in self.model.fitpars]
         self.WeightLabel = QtWidgets.QLabel('Weighted Fit:')
         self.Yweightcombobox = QtWidgets.QComboBox()
         self.Yweightcombobox.addItems(weightoptions)
+        self.SolverLabel = QtWidgets.QLabel('Solver:')
+        self.Solvercombobox = QtWidgets.QComboBox()
+        self.Solvercombobox.addItems(solveroptions)
         HBox.addWidget(self.WeightLabel)
         HBox.addWidget(self.Yweightcombobox)
+        HBox.addWidget(self.SolverLabel)
+        HBox.addWidget(self.Solvercombobox)
         HBox.addStretch(1)
         for parview in self.parviews:
             VBox.addWidget(parview)
+            parview.changed.connect(self.changed)
         VBox.addLayout(HBox)
         self.setLayout(VBox)
         return None
 
+    def set_model(self, model):
+        """ shows and controls another model with the same fitparameters """
+        self.model = model
+        for parview, par in zip(self.parviews, model.fitpars):
+            parview.set_par(par)
+        self.set_weight()
+        self.set_method()
+
     def disable_weight(self):
         self.Yweightcombobox.setDisabled(True)
 
@@ -359,13 +798,35 @@ class ModelWidget(QtWidgets.QGroupBox):
         if index >= 0:
             self.Yweightcombobox.setCurrentIndex(index)
 
+    def get_method(self):
+        return self.Solvercombobox.currentText()
+
+    def set_method(self):
+        index = self.Solvercombobox.findText(self.model.method, QtCore.Qt.MatchFlag.MatchFixedString)
+        if index >= 0:
+            self.Solvercombobox.setCurrentIndex(index)
+
     def read_values(self):
         """ reads values from userinput into the model """
         for parview in self.parviews:
             parview.read_value()
         self.model.weight = self.get_weight()
+        self.model.method = self.get_method()
+        bounded = np.any(np.isfinite(self.model.lower)) or np.any(np.isfinite(self.model.upper))
+        if self.model.method == 'lm' and bounded:
+            self.model.method = 'trf'  # lm does not support bounds, as for bounds passed to the Fitter
+            self.set_method()
         return None
         
+    def get_values(self):
+        """ returns the parameter values entered by the user without changing the model """
+        return [parview.get_value() for parview in self.parviews]
+
+    def set_preview(self, enabled):
+        """ shows the parameter sliders in live preview mode """
+        for parview in self.parviews:
+            parview.set_slider_visible(enabled)
+
     def update_values(self):
         for parview in self.parviews:
             parview.update_value()